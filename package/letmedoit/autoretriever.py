@@ -20,19 +20,24 @@ if not hasattr(config, "openaiApiKey") or not config.openaiApiKey:
 HealthCheck.checkCompletion()
 HealthCheck.setPrint()
 
-import autogen, os, json, traceback, chromadb, re, zipfile, datetime, traceback
+import autogen, os, json, traceback, chromadb, re, zipfile, datetime, traceback, hashlib
 from chromadb.config import Settings
 from pathlib import Path
 from letmedoit.utils.prompts import Prompts
 from prompt_toolkit import print_formatted_text, HTML
 from prompt_toolkit.styles import Style
-from autogen.retrieve_utils import TEXT_FORMATS
+from autogen.retrieve_utils import TEXT_FORMATS, get_files_from_dir, split_files_to_chunks
 from autogen.agentchat.contrib.retrieve_assistant_agent import RetrieveAssistantAgent
 from autogen.agentchat.contrib.retrieve_user_proxy_agent import RetrieveUserProxyAgent
 
 
 class AutoGenRetriever:
 
+    # the chunk token size for the retrieve chat
+    chunkTokenSize = 2000
+    # number of chunks sent to the vector database at a time
+    batchSize = 500
+
     def __init__(self):
         #config_list = autogen.get_config_list(
         #    [config.openaiApiKey], # assume openaiApiKey is in place in config.py
@@ -63,13 +68,15 @@ class AutoGenRetriever:
         _, file_extension = os.path.splitext(docs_path)
         # support zip file; unzip zip file, if any
         if file_extension.lower() == ".zip":
-            currentTime = re.sub("[\. :]", "_", str(datetime.datetime.now()))
-            extract_to_path = os.path.join(db, "unpacked", currentTime)
-            config.print3(f"Unpacking content to: {extract_to_path}")
+            # unpack an unchanged zip file to the same folder, so that its index can be reused
+            stat = os.stat(docs_path)
+            zipKey = hashlib.md5(f"{os.path.abspath(docs_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+            extract_to_path = os.path.join(db, "unpacked", zipKey)
             if not os.path.isdir(extract_to_path):
-                Path(db).mkdir(parents=True, exist_ok=True)
-            with zipfile.ZipFile(docs_path) as zip_ref:
-                zip_ref.extractall(extract_to_path)
+                config.print3(f"Unpacking content to: {extract_to_path}")
+                Path(extract_to_path).mkdir(parents=True, exist_ok=True)
+                with zipfile.ZipFile(docs_path) as zip_ref:
+                    zip_ref.extractall(extract_to_path)
             docs_path = extract_to_path
         # check if file format is supported
         if os.path.isfile(docs_path):
@@ -100,9 +107,10 @@ class AutoGenRetriever:
 
         client = chromadb.PersistentClient(db, Settings(anonymized_telemetry=False))
         try:
-            client.delete_collection(name="autogen-docs")
+            collectionName = self.updateIndex(client, db, docs_path)
         except:
-            pass
+            print(traceback.format_exc())
+            return []
         try:
             # https://microsoft.github.io/autogen/docs/reference/agentchat/contrib/retrieve_user_proxy_agent
             ragproxyagent = RetrieveUserProxyAgent(
@@ -111,13 +119,14 @@ class AutoGenRetriever:
                 max_consecutive_auto_reply=config.max_consecutive_auto_reply,
                 retrieve_config={
                     #"task": "qa", # the task of the retrieve chat. Possible values are "code", "qa" and "default". System prompt will be different for different tasks. The default value is default, which supports both code and qa.
-                    "docs_path": docs_path,
-                    "chunk_token_size": 2000, # the chunk token size for the retrieve chat. If key not provided, a default size max_tokens * 0.4 will be used.
+                    "docs_path": None, # documents are indexed with self.updateIndex; the agent queries the existing collection only
+                    "collection_name": collectionName,
+                    "chunk_token_size": self.chunkTokenSize, # the chunk token size for the retrieve chat. If key not provided, a default size max_tokens * 0.4 will be used.
                     "model": config_list[0]["model"],
                     "client": client,
                     "embedding_function": HealthCheck.getEmbeddingFunction(),
                     #"embedding_model": "all-mpnet-base-v2", # the embedding model to use for the retrieve chat. If key not provided, a default model all-MiniLM-L6-v2 will be used. All available models can be found at https://www.sbert.net/docs/pretrained_models.html. The default model is a fast model. If you want to use a high performance model, all-mpnet-base-v2 is recommended.
-                    "get_or_create": False,  # set to False if you don't want to reuse an existing collection, but you'll need to remove the collection manually
+                    "get_or_create": True,  # reuse the collection prepared by self.updateIndex
                     "must_break_at_empty_line": False, # (Optional, bool): chunk will only break at empty line if True. Default is True. If chunk_mode is "one_line", this parameter will be ignored.
                 },
             )
@@ -137,6 +146,96 @@ class AutoGenRetriever:
             last_message = []
         return last_message
 
+    def getCollectionName(self, docs_path):
+        # each corpus has its own collection
+        key = f"{os.path.abspath(docs_path)}|{config.embeddingModel}|{self.chunkTokenSize}"
+        return f"docs-{hashlib.md5(key.encode()).hexdigest()}"
+
+    @staticmethod
+    def getFileHash(filepath):
+        fileHash = hashlib.md5()
+        with open(filepath, "rb") as fileObj:
+            for block in iter(lambda: fileObj.read(1048576), b""):
+                fileHash.update(block)
+        return fileHash.hexdigest()
+
+    def getChunks(self, filepath):
+        chunks = split_files_to_chunks([filepath], max_tokens=self.chunkTokenSize, must_break_at_empty_line=False)
+        # newer versions of autogen return chunks together with their sources
+        return chunks[0] if isinstance(chunks, tuple) else chunks
+
+    def updateIndex(self, client, db, docs_path):
+        """
+        Index documents in docs_path incrementally.
+        Unchanged files are reused, changed files are re-embedded and deleted files are pruned.
+        Return the name of the collection that holds the documents.
+        """
+        collectionName = self.getCollectionName(docs_path)
+        indexFile = os.path.join(db, f"{collectionName}.json")
+        try:
+            with open(indexFile, "r", encoding="utf-8") as fileObj:
+                indexedFiles = json.load(fileObj)["files"]
+        except:
+            indexedFiles = {}
+            # an existing collection without a valid index cannot be updated incrementally
+            try:
+                client.delete_collection(name=collectionName)
+            except:
+                pass
+        # use the same collection settings as autogen does
+        collection = client.get_or_create_collection(
+            name=collectionName,
+            embedding_function=HealthCheck.getEmbeddingFunction(),
+            metadata={"hnsw:space": "ip", "hnsw:construction_ef": 30, "hnsw:M": 32},
+        )
+
+        files = {}
+        indexChanged = not os.path.isfile(indexFile)
+        removedIds = []
+        newChunks, newIds, newMetadatas = [], [], []
+        for filepath in sorted(set(os.path.abspath(i) for i in get_files_from_dir(docs_path))):
+            stat = os.stat(filepath)
+            entry = indexedFiles.get(filepath)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                files[filepath] = entry
+                continue
+            fileHash = self.getFileHash(filepath)
+            if entry and entry["hash"] == fileHash:
+                # content is unchanged, e.g. a touched file
+                entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime_ns
+                files[filepath] = entry
+                indexChanged = True
+                continue
+            if entry:
+                removedIds += entry["ids"]
+            chunks = self.getChunks(filepath)
+            idPrefix = hashlib.md5(f"{filepath}|{fileHash}".encode()).hexdigest()
+            ids = [f"{idPrefix}-{i}" for i in range(len(chunks))]
+            files[filepath] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": fileHash, "ids": ids}
+            newChunks += chunks
+            newIds += ids
+            newMetadatas += [{"source": filepath} for _ in chunks]
+        # prune deleted files
+        for filepath, entry in indexedFiles.items():
+            if not filepath in files:
+                removedIds += entry["ids"]
+
+        if removedIds:
+            for i in range(0, len(removedIds), self.batchSize):
+                collection.delete(ids=removedIds[i:i + self.batchSize])
+        if newChunks:
+            config.print2(f"Embedding {len(newChunks)} chunk(s) ...")
+            for i in range(0, len(newChunks), self.batchSize):
+                collection.add(
+                    documents=newChunks[i:i + self.batchSize],
+                    ids=newIds[i:i + self.batchSize],
+                    metadatas=newMetadatas[i:i + self.batchSize],
+                )
+        if indexChanged or removedIds or newChunks:
+            with open(indexFile, "w", encoding="utf-8") as fileObj:
+                json.dump({"docs_path": os.path.abspath(docs_path), "files": files}, fileObj)
+        return collectionName
+
     def print(self, message):
         #print(message)
         print_formatted_text(HTML(message))
@@ -1,6 +1,5 @@
-import os, traceback, json, pprint, wcwidth, textwrap, threading, time
+import os, traceback, json, pprint, textwrap, threading, time
 import openai
-from openai import OpenAI
 from pygments.styles import get_style_by_name
 from prompt_toolkit.styles.pygments import style_from_pygments_cls
 from prompt_toolkit import print_formatted_text, HTML
@@ -9,6 +8,7 @@ from prompt_toolkit.filters import Condition
 from prompt_toolkit.key_binding import KeyBindings, merge_key_bindings
 from prompt_toolkit.clipboard.pyperclip import PyperclipClipboard
 from letmedoit.utils.prompt_shared_key_bindings import prompt_shared_key_bindings
+from letmedoit.utils.text_wrapper import TextWrapper
 
 thisFile = os.path.realpath(__file__)
 packageFolder = os.path.dirname(thisFile)
@@ -19,6 +19,7 @@ configFile = os.path.join(packageFolder, "config.py")
 if not os.path.isfile(configFile):
     open(configFile, "a", encoding="utf-8").close()
 from letmedoit import config
+from letmedoit.utils.openai_client import OpenAIClient
 from pathlib import Path
 
 class HealthCheck:
@@ -28,6 +29,10 @@ class HealthCheck:
     @staticmethod
     def setBasicConfig(): # minimum config to work with standalone scripts built with AutoGen
         config.openaiApiKey = ''
+        config.openaiApiTimeout = 600.0
+        config.openaiApiConnectTimeout = 5.0
+        config.openaiApiMaxConnections = 20
+        config.openaiApiKeepAlive = 60.0
         config.chatGPTApiModel = 'gpt-3.5-turbo-16k'
         config.llmTemperature = 0.8
         config.max_consecutive_auto_reply = 10
@@ -123,10 +128,7 @@ class HealthCheck:
 
     @staticmethod
     def getStringWidth(text):
-        width = 0
-        for character in text:
-            width += wcwidth.wcwidth(character)
-        return width
+        return TextWrapper.getStringWidth(text)
 
     @staticmethod
     def getPygmentsStyle():
@@ -187,12 +189,9 @@ class HealthCheck:
 
     @staticmethod
     def getEmbeddingFunction(embeddingModel=None):
-        # import statement is placed here to make this file compatible on Android
-        from chromadb.utils import embedding_functions
-        embeddingModel = embeddingModel if embeddingModel is not None else config.embeddingModel
-        if embeddingModel == "text-embedding-ada-002":
-            return embedding_functions.OpenAIEmbeddingFunction(api_key=config.openaiApiKey, model_name="text-embedding-ada-002")
-        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=embeddingModel) # support custom Sentence Transformer Embedding models by modifying config.embeddingModel
+        # embedding models are loaded once per process
+        from letmedoit.utils.embedding_service import EmbeddingService
+        return EmbeddingService.getEmbeddingFunction(embeddingModel)
 
     @staticmethod
     def changeAPIkey():
@@ -206,8 +205,8 @@ class HealthCheck:
     def checkCompletion():
         # instantiate a client that can shared with plugins
         os.environ["OPENAI_API_KEY"] = config.openaiApiKey
-        client = OpenAI()
         try:
+            client = OpenAIClient.getClient()
             client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content" : "hello"}],
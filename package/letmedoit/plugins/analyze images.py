@@ -11,7 +11,7 @@ reference: https://platform.openai.com/docs/guides/vision
 from letmedoit import config
 from letmedoit.utils.shared_utils import SharedUtil
 import openai, os
-from openai import OpenAI
+from letmedoit.utils.openai_client import OpenAIClient
 
 def analyze_images(function_args):
     query = function_args.get("query") # required
@@ -43,7 +43,7 @@ def analyze_images(function_args):
         content.insert(0, {"type": "text", "text": query,})
         #print(content)
         try:
-            response = OpenAI().chat.completions.create(
+            response = OpenAIClient.getClient().chat.completions.create(
                 model="gpt-4-vision-preview",
                 messages=[
                     {
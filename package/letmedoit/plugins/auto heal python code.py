@@ -34,8 +34,8 @@ def heal_python(function_args):
         config.print2("Running improved code ...")
         if config.developer or config.codeDisplay:
             SharedUtil.displayPythonCode(fix)
-        exec(SharedUtil.fineTunePythonCode(fix), globals())
-        return "EXECUTED"
+        trace = SharedUtil.runPythonCode(SharedUtil.fineTunePythonCode(fix))
+        return trace if trace else "EXECUTED"
     except:
         return traceback.format_exc()
 
@@ -12,11 +12,12 @@ except:
     from letmedoit.utils.install import *
     installmodule(f"--upgrade apsw")
 from letmedoit import config
-import os, re, json, shutil
+import os, re, json, shutil, itertools
 from prompt_toolkit import print_formatted_text, HTML
 from letmedoit.utils.file_utils import FileUtil
 from letmedoit.plugins.bibleTools.utils.TextUtil import TextUtil
 from letmedoit.plugins.bibleTools.utils.BibleBooks import BibleBooks
+from letmedoit.plugins.bibleTools.utils.BibleDatabase import BibleDatabase
 
 def getBibleList(version=""):
     bibleFolder = os.path.join(config.bibleDataCurrent, "bibles")
@@ -31,6 +32,8 @@ def search_bible(function_args):
     terminal_width = shutil.get_terminal_size().columns
     # get the sql query statement
     query = function_args.get("query") # required
+    # remove trailing semicolons, e.g. "SELECT * FROM Verses WHERE Book=1;"
+    query = query.strip().rstrip(";").rstrip()
     if not query.startswith("SELECT "):
         query = f"SELECT * FROM Verses WHERE {query}"
     version = function_args.get("version") # required
@@ -64,7 +67,7 @@ def search_bible(function_args):
         # fix highlighting
         textContent = TextUtil.fixTextHighlighting(textContent)
         return TextUtil.htmlToPlainText(textContent)
-    def displaySingleVerse(bible, c, v, verseText):
+    def formatSingleVerse(bible, c, v, verseText, wrapWords=True):
         selectedBible = bible
         if searchWords:
             verseText = highlightSearchResults(verseText)
@@ -75,25 +78,9 @@ def search_bible(function_args):
         bible = f"[{bible}] " if compareMode and compareVersions else ""
         thisVerse = f"<{config.terminalResourceLinkColor}>{c}:{v}</{config.terminalResourceLinkColor}> {verseText}"
         verseContent = f"{bible}{thisVerse}"
-        if config.wrapWords and not selectedBible in config.noWordWrapBibles:
+        if wrapWords and config.wrapWords and not selectedBible in config.noWordWrapBibles:
             verseContent = config.getWrappedHTMLText(verseContent, terminal_width)
-        print_formatted_text(HTML(verseContent))
-        config.addPagerText(verseContent)
-        return thisVerse
-    def getSingleVerse(bible, b, c, v):
-        database = os.path.join(config.bibleDataCurrent, "bibles", f"{bible}.bible")
-        if os.path.isfile(database):
-            with apsw.Connection(database) as connection:
-                cursor = connection.cursor()
-                query = "SELECT * FROM Verses WHERE Book=? AND Chapter=? AND Verse=?"
-                cursor.execute(query, (b, c, v))
-                result = cursor.fetchone()
-                if result:
-                    return result if result[-1] else ()
-                else:
-                    return ()
-        return ()
-
+        return verseContent
     addText = f"loading bible {config.mainText} ..."
     config.print(addText)
     config.addPagerText(addText)
@@ -102,70 +89,73 @@ def search_bible(function_args):
         config.print(query)
         config.addPagerText(query)
 
-    database = os.path.join(config.bibleDataCurrent, "bibles", f"{config.mainText}.bible")
-    if os.path.isfile(database):
+    # connections are kept open for later searches
+    connection = BibleDatabase.getConnection(config.mainText)
+    if connection is not None:
         config.tempContent = ""
         config.stopSpinning()
-        with apsw.Connection(database) as connection:
-            # support regular expression
-            connection.createscalarfunction("REGEXP", TextUtil.regexp)
-            cursor = connection.cursor()
-            # support case sensitive search in query prefix
-            cursor.execute(TextUtil.getQueryPrefix()+query)
-            if not query.lower().startswith("select * from verses where"):
-                results = cursor.fetchall()
-                # return information, e.g. how many chapters in Genesis
-                return json.dumps(results)
-            book = 0
-            bookName = ""
-            total = 0
-            subTotal = 0
-            subTotals = {}
-            config.print(config.divider)
-            config.addPagerText(config.divider)
-            for b, c, v, verseText in cursor.fetchall():
-                config.mainB, config.mainC, config.mainV = b, c, v
+        cursor = connection.cursor()
+        # support case sensitive search in query prefix
+        # searches are narrowed with a full-text index of the bible, if available
+        searchQuery = BibleDatabase.getSearchQuery(config.mainText, connection, query)
+        if not query.lower().startswith("select * from verses where"):
+            cursor.execute(TextUtil.getQueryPrefix()+searchQuery)
+            results = cursor.fetchall()
+            # return information, e.g. how many chapters in Genesis
+            return json.dumps(results)
+        total = 0
+        subTotals = {}
+        # once results exceed config.bibleSearchPagerThreshold, further verses are displayed in pager instead of terminal
+        paging = False
+        pagerText = []
+        tempContent = []
+        config.print(config.divider)
+        config.addPagerText(config.divider)
+        book = 0
+        b = c = v = None
+        rows = iter(cursor.execute(TextUtil.getQueryPrefix()+searchQuery))
+        # verses are read and displayed in batches
+        while results := list(itertools.islice(rows, config.bibleSearchBatchSize)):
+            # verses of comparison versions are fetched at once for each batch
+            if compareMode and compareVersions:
+                compareVerses = BibleDatabase.compareVerses(compareVersions, [(b, c, v) for b, c, v, _ in results])
+            lines = []
+            for b, c, v, verseText in results:
                 if not book == b:
-                    if not book == 0 and bookName:
-                        total += subTotal
-                        bookName = re.sub("<u><b>|</b></u>", "", bookName)
-                        subTotals[bookName] = subTotal
-                        subTotal = 0
                     book = b
                     bookName = abbrev[str(b)][-1]
-                    config.tempContent += f"{bookName}\n"
-                    bookName = f"<u><b><{config.terminalHeadingTextColor}>{bookName}</{config.terminalHeadingTextColor}></b></u>"
-                    print_formatted_text(HTML(bookName))
-                    config.addPagerText(bookName)
-                displaySingleVerse(config.mainText, c, v, verseText)
-                config.tempContent += f"{c}:{v}\n"
-                # thisVerse = displaySingleVerse(config.mainText, c, v, verseText)
-                # config.tempContent += f"{thisVerse}\n"
-                subTotal += 1
+                    subTotals[bookName] = 0
+                    tempContent.append(bookName)
+                    lines.append(f"<u><b><{config.terminalHeadingTextColor}>{bookName}</{config.terminalHeadingTextColor}></b></u>")
+                lines.append(formatSingleVerse(config.mainText, c, v, verseText, wrapWords=not paging))
+                tempContent.append(f"{c}:{v}")
+                subTotals[bookName] += 1
                 # bible comparison
                 if compareMode and compareVersions:
                     for bible in compareVersions:
-                        singleVerse = getSingleVerse(bible, b, c, v)
-                        if singleVerse:
-                            _, c, v, verseText = getSingleVerse(bible, b, c, v)
-                            displaySingleVerse(bible, c, v, verseText)
-            # include statistics of the last book
-            if bookName:
-                total += subTotal
-                bookName = re.sub("<u><b>|</b></u>", "", bookName)
-                subTotals[bookName] = subTotal
-            config.tempContent = re.sub("<[^<>]*?>", "", config.tempContent)
-            config.print(config.divider)
-            config.addPagerText(config.divider)
-            for key, value in subTotals.items():
-                addText = f"{key} x {value}"
-                print_formatted_text(HTML(addText))
-                config.addPagerText(addText)
-            config.print(config.divider)
-            config.addPagerText(config.divider)
-            addText = f"Total: {total} verse(s)"
-            print_formatted_text(HTML(addText))
-            config.addPagerText(addText)
+                        compareVerse = compareVerses[bible].get((b, c, v))
+                        if compareVerse:
+                            lines.append(formatSingleVerse(bible, c, v, compareVerse, wrapWords=not paging))
+            total += len(results)
+            if not paging:
+                # write a batch of verses at once
+                print_formatted_text(HTML("\n".join(lines)))
+                if total > config.bibleSearchPagerThreshold:
+                    paging = True
+                    config.print(f"More than {config.bibleSearchPagerThreshold} verses are found; all results are displayed in pager ...")
+            pagerText += lines
+        if b is not None:
+            config.mainB, config.mainC, config.mainV = b, c, v
+        config.tempContent = "\n".join(tempContent) + "\n" if tempContent else ""
+        summary = [config.divider]
+        summary += [f"{key} x {value}" for key, value in subTotals.items()]
+        summary += [config.divider, f"Total: {total} verse(s)"]
+        pagerText += summary
+        pagerText = "\n".join(pagerText)
+        config.addPagerText(pagerText)
+        if paging:
+            config.launchPager(pagerText)
+        print_formatted_text(HTML("\n".join(summary)))
     return ""
 
 # add bible books to input suggestions
@@ -193,6 +183,8 @@ persistentConfigs = (
     ("bibleData", ""),
     ("enableCaseSensitiveSearch", False),
     ("noWordWrapBibles", []), # some bibles display better, without word wrap feature, e.g. CUV
+    ("bibleSearchBatchSize", 200), # number of verses read and displayed at a time
+    ("bibleSearchPagerThreshold", 500), # search results with more verses than this are displayed in pager
 )
 config.setConfig(persistentConfigs)
 # temporary
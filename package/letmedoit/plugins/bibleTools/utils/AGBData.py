@@ -0,0 +1,114 @@
+import os, sys, array, bisect, threading
+
+
+class AGBData:
+
+    # subheadings and paragraphs of AGB, stored in compact files converted from modules AGBsubheadings and AGBparagraphs_expanded
+    # a file holds the number of references, references sorted as unsigned 32-bit integers, and utf-8 text of subheadings, one per line
+    # files are loaded on first use; a verse is looked up with binary search
+    folder = os.path.dirname(os.path.abspath(__file__))
+    subheadingsFile = os.path.join(folder, "AGBsubheadings.dat")
+    paragraphsFile = os.path.join(folder, "AGBparagraphs.dat")
+    subheadingRefs = None
+    subheadings = None
+    paragraphRefs = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def encode(b, c, v):
+        # chapter and verse numbers of the bible are less than 256
+        return (b << 16) | (c << 8) | v
+
+    @staticmethod
+    def decode(ref):
+        return ref >> 16, (ref >> 8) & 0xFF, ref & 0xFF
+
+    @staticmethod
+    def write(filepath, refs, texts=None):
+        refs = array.array("I", refs)
+        if sys.byteorder == "big":
+            refs.byteswap()
+        with open(filepath, "wb") as fileObj:
+            fileObj.write(len(refs).to_bytes(4, "little"))
+            refs.tofile(fileObj)
+            if texts is not None:
+                fileObj.write("\n".join(texts).encode("utf-8"))
+
+    @staticmethod
+    def read(filepath):
+        with open(filepath, "rb") as fileObj:
+            count = int.from_bytes(fileObj.read(4), "little")
+            refs = array.array("I")
+            refs.fromfile(fileObj, count)
+            if sys.byteorder == "big":
+                refs.byteswap()
+            text = fileObj.read().decode("utf-8")
+        return refs, text.split("\n") if text else []
+
+    @staticmethod
+    def build():
+        # convert python modules of AGB data into compact files; run "python3 -m letmedoit.plugins.bibleTools.utils.AGBData" when the modules are changed
+        from letmedoit.plugins.bibleTools.utils.AGBsubheadings import agbSubheadings
+        from letmedoit.plugins.bibleTools.utils.AGBparagraphs_expanded import agbParagraphs
+        subheadings = sorted((AGBData.encode(*(int(i) for i in key.split("."))), text) for key, text in agbSubheadings.items())
+        AGBData.write(AGBData.subheadingsFile, [ref for ref, _ in subheadings], [text for _, text in subheadings])
+        AGBData.write(AGBData.paragraphsFile, sorted(set(AGBData.encode(*i) for i in agbParagraphs)))
+
+    @staticmethod
+    def loadSubheadings():
+        with AGBData.lock:
+            if AGBData.subheadingRefs is None:
+                AGBData.subheadingRefs, AGBData.subheadings = AGBData.read(AGBData.subheadingsFile)
+        return AGBData.subheadingRefs
+
+    @staticmethod
+    def loadParagraphs():
+        with AGBData.lock:
+            if AGBData.paragraphRefs is None:
+                AGBData.paragraphRefs, _ = AGBData.read(AGBData.paragraphsFile)
+        return AGBData.paragraphRefs
+
+    @staticmethod
+    def getRange(refs, b, c):
+        # return positions of references of a chapter
+        return bisect.bisect_left(refs, AGBData.encode(b, c, 0)), bisect.bisect_left(refs, AGBData.encode(b, c + 1, 0))
+
+    @staticmethod
+    def getSubheading(b, c, v):
+        # return subheading that starts at a verse, or an empty string
+        refs = AGBData.loadSubheadings()
+        ref = AGBData.encode(b, c, v)
+        index = bisect.bisect_left(refs, ref)
+        return AGBData.subheadings[index] if index < len(refs) and refs[index] == ref else ""
+
+    @staticmethod
+    def getChapterSubheadings(b, c):
+        # return a list of verse numbers and subheadings of a chapter, e.g. [(1, "Creation of the heavens and the earth"), ...]
+        refs = AGBData.loadSubheadings()
+        start, end = AGBData.getRange(refs, b, c)
+        return [(refs[i] & 0xFF, AGBData.subheadings[i]) for i in range(start, end)]
+
+    @staticmethod
+    def getChapterParagraphs(b, c):
+        # return a list of verse numbers that start paragraphs in a chapter
+        refs = AGBData.loadParagraphs()
+        start, end = AGBData.getRange(refs, b, c)
+        return [refs[i] & 0xFF for i in range(start, end)]
+
+    @staticmethod
+    def isParagraphStart(b, c, v):
+        refs = AGBData.loadParagraphs()
+        ref = AGBData.encode(b, c, v)
+        index = bisect.bisect_left(refs, ref)
+        return index < len(refs) and refs[index] == ref
+
+    @staticmethod
+    def getParagraph(b, c, v):
+        # return (book, chapter, verse) where the paragraph of a verse starts, or None if the verse comes before all paragraphs
+        refs = AGBData.loadParagraphs()
+        index = bisect.bisect_right(refs, AGBData.encode(b, c, v)) - 1
+        return AGBData.decode(refs[index]) if index >= 0 else None
+
+
+if __name__ == "__main__":
+    AGBData.build()
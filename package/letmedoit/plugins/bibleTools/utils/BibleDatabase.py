@@ -0,0 +1,162 @@
+import apsw, os, re, threading
+from letmedoit import config
+from letmedoit.plugins.bibleTools.utils.TextUtil import TextUtil
+
+
+class BibleDatabase:
+
+    # one long-lived connection per bible module, keyed by database path
+    connections = {}
+    # an in-memory database that attaches bible modules for comparison
+    compareConnection = None
+    # attached bible modules, mapping database paths to schema names
+    attached = {}
+    # connections to which a full-text index is attached, as schema "fts"
+    indexedConnections = set()
+    # bible modules that cannot be indexed, e.g. fts5 is not supported
+    unindexed = set()
+    lock = threading.RLock()
+    # predicates that can be narrowed with a trigram full-text index, e.g. Scripture LIKE '%love%' or Scripture REGEXP '\\blove\\b'
+    # a column name may be qualified with a table name or alias, e.g. v.Scripture LIKE '%love%'; names qualified with a schema are not matched
+    likePattern = re.compile("""(?<![\\w.])(?:(?P<table>\\w+)\\.)?Scripture LIKE (?P<quote>['"])%(?P<text>[^%_'"]+?)%(?P=quote)(?!\\s*ESCAPE)""", flags=re.IGNORECASE)
+    regexpPattern = re.compile("""(?<![\\w.])(?:(?P<table>\\w+)\\.)?Scripture REGEXP (?P<quote>['"])(?:\\\\b)?(?P<text>[\\w ]+?)(?:\\\\b)?(?P=quote)""", flags=re.IGNORECASE)
+
+    @staticmethod
+    def getDatabase(bible):
+        return os.path.join(config.bibleDataCurrent, "bibles", f"{bible}.bible")
+
+    @staticmethod
+    def getConnection(bible):
+        # return a shared connection to a bible module, or None if the module does not exist
+        database = BibleDatabase.getDatabase(bible)
+        with BibleDatabase.lock:
+            connection = BibleDatabase.connections.get(database)
+            if connection is None:
+                if not os.path.isfile(database):
+                    return None
+                connection = apsw.Connection(database)
+                # support regular expression
+                connection.createscalarfunction("REGEXP", TextUtil.regexp)
+                BibleDatabase.connections[database] = connection
+            return connection
+
+    @staticmethod
+    def getIndexFile(bible):
+        folder = os.path.join(config.getStorageDir(), "cache", "bibles")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"{bible}.fts")
+
+    @staticmethod
+    def buildIndex(bible):
+        # build a sidecar trigram index of a bible module, which is rebuilt when the module is changed
+        # rows of the index share rowid with table Verses of the module; text is not stored in the index
+        database = BibleDatabase.getDatabase(bible)
+        stat = os.stat(database)
+        key = f"{stat.st_size}:{stat.st_mtime_ns}"
+        indexFile = BibleDatabase.getIndexFile(bible)
+        index = apsw.Connection(indexFile)
+        cursor = index.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS Meta (Key TEXT)")
+        if (key,) in list(cursor.execute("SELECT Key FROM Meta")):
+            return indexFile
+        config.print(f"Indexing bible {bible} ...")
+        cursor.execute("DROP TABLE IF EXISTS VerseIndex")
+        cursor.execute("DELETE FROM Meta")
+        cursor.execute("CREATE VIRTUAL TABLE VerseIndex USING fts5(Scripture, content='', tokenize='trigram')")
+        cursor.execute("ATTACH DATABASE ? AS bible", (database,))
+        with index:
+            cursor.execute("INSERT INTO VerseIndex(rowid, Scripture) SELECT rowid, Scripture FROM bible.Verses WHERE Scripture IS NOT NULL")
+            cursor.execute("INSERT INTO Meta VALUES (?)", (key,))
+        cursor.execute("DETACH DATABASE bible")
+        index.close()
+        return indexFile
+
+    @staticmethod
+    def attachIndex(bible, connection):
+        # return True if a full-text index is attached to the connection of a bible module
+        with BibleDatabase.lock:
+            if id(connection) in BibleDatabase.indexedConnections:
+                return True
+            if bible in BibleDatabase.unindexed:
+                return False
+            try:
+                indexFile = BibleDatabase.buildIndex(bible)
+                connection.cursor().execute("ATTACH DATABASE ? AS fts", (indexFile,))
+                BibleDatabase.indexedConnections.add(id(connection))
+                return True
+            except:
+                BibleDatabase.unindexed.add(bible)
+                if config.developer:
+                    print(f"Failed to index bible {bible}!")
+                return False
+
+    @staticmethod
+    def getSearchQuery(bible, connection, query):
+        # narrow LIKE and plain word REGEXP searches of three or more characters with the full-text index
+        # the original predicates are kept to filter the matched verses, so that results are unchanged
+        def getFtsPredicate(match):
+            # rowid is qualified in the same way as the column, as a table alias hides the table name
+            table = match.group("table") if match.group("table") else "Verses"
+            return f"""({table}.rowid IN (SELECT rowid FROM fts.VerseIndex WHERE VerseIndex MATCH '"{match.group("text")}"') AND {match.group(0)})"""
+        def isIndexable(match):
+            text = match.group("text")
+            return len(text) >= 3 and not '"' in text
+        likeSearches = [m for m in BibleDatabase.likePattern.finditer(query) if isIndexable(m)]
+        regexpSearches = [m for m in BibleDatabase.regexpPattern.finditer(query) if isIndexable(m)]
+        if not (likeSearches or regexpSearches) or not BibleDatabase.attachIndex(bible, connection):
+            return query
+        query = BibleDatabase.likePattern.sub(lambda m: getFtsPredicate(m) if isIndexable(m) else m.group(0), query)
+        return BibleDatabase.regexpPattern.sub(lambda m: getFtsPredicate(m) if isIndexable(m) else m.group(0), query)
+
+    @staticmethod
+    def getCompareConnection():
+        if BibleDatabase.compareConnection is None:
+            connection = apsw.Connection(":memory:")
+            connection.cursor().execute("CREATE TEMP TABLE Refs (Book INT, Chapter INT, Verse INT)")
+            BibleDatabase.compareConnection = connection
+        return BibleDatabase.compareConnection
+
+    @staticmethod
+    def attach(connection, databases):
+        # attach databases, detaching those not needed when the number of attached databases would exceed the limit of sqlite
+        maxAttached = connection.limit(apsw.SQLITE_LIMIT_ATTACHED)
+        cursor = connection.cursor()
+        newDatabases = [i for i in databases if not i in BibleDatabase.attached]
+        if len(BibleDatabase.attached) + len(newDatabases) > maxAttached:
+            for database, schema in list(BibleDatabase.attached.items()):
+                if not database in databases:
+                    cursor.execute(f"DETACH DATABASE {schema}")
+                    del BibleDatabase.attached[database]
+        usedSchemas = set(BibleDatabase.attached.values())
+        index = 0
+        for database in newDatabases:
+            while f"bible{index}" in usedSchemas:
+                index += 1
+            schema = f"bible{index}"
+            cursor.execute(f"ATTACH DATABASE ? AS {schema}", (database,))
+            BibleDatabase.attached[database] = schema
+            usedSchemas.add(schema)
+
+    @staticmethod
+    def compareVerses(bibles, references):
+        # return verses of all bibles for a list of references (book, chapter, verse), fetched with one join per batch of attached bibles
+        # verses are returned in a dictionary, e.g. {"KJV": {(43, 3, 16): "For God so loved the world, ..."}}; empty verses are left out
+        verses = {bible: {} for bible in bibles}
+        databases = {BibleDatabase.getDatabase(bible): bible for bible in bibles}
+        databases = {database: bible for database, bible in databases.items() if os.path.isfile(database)}
+        if not databases or not references:
+            return verses
+        with BibleDatabase.lock:
+            connection = BibleDatabase.getCompareConnection()
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM Refs")
+            cursor.executemany("INSERT INTO Refs VALUES (?, ?, ?)", list(dict.fromkeys(references)))
+            databaseList = list(databases.keys())
+            maxAttached = connection.limit(apsw.SQLITE_LIMIT_ATTACHED)
+            for start in range(0, len(databaseList), maxAttached):
+                batch = databaseList[start:start + maxAttached]
+                BibleDatabase.attach(connection, batch)
+                query = " UNION ALL ".join(f"""SELECT ? AS Bible, Verses.Book, Verses.Chapter, Verses.Verse, Verses.Scripture FROM Refs JOIN {BibleDatabase.attached[database]}.Verses AS Verses ON Verses.Book=Refs.Book AND Verses.Chapter=Refs.Chapter AND Verses.Verse=Refs.Verse WHERE Verses.Scripture<>''""" for database in batch)
+                for bible, b, c, v, verseText in cursor.execute(query, tuple(databases[database] for database in batch)):
+                    verses[bible][(b, c, v)] = verseText
+        return verses
@@ -28,9 +28,17 @@ class TextUtil:
     def getQueryPrefix():
         return "PRAGMA case_sensitive_like = {0}; ".format("true" if config.enableCaseSensitiveSearch else "false")
 
+    # compiled patterns of REGEXP searches, which are called once for every verse searched
+    regexCache = {}
+
     @staticmethod
     def regexp(expr, item):
-        reg = re.compile(expr, flags=0 if config.enableCaseSensitiveSearch else re.IGNORECASE)
+        flags = 0 if config.enableCaseSensitiveSearch else re.IGNORECASE
+        reg = TextUtil.regexCache.get((expr, flags))
+        if reg is None:
+            if len(TextUtil.regexCache) >= 256:
+                TextUtil.regexCache.clear()
+            reg = TextUtil.regexCache[(expr, flags)] = re.compile(expr, flags=flags)
         #return reg.match(item) is not None
         return reg.search(item) is not None
 
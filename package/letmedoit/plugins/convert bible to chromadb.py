@@ -0,0 +1,216 @@
+"""
+LetMeDoIt AI Plugin - convert bible to chromadb
+
+convert bible modules into chromadb collections, for searching verses by meaning, books, literal text and regular expression
+
+Each bible module is converted once only. Conversion resumes from the last saved batch when it is interrupted, and it is repeated only when the bible module or embedding model is changed.
+
+[FUNCTION_CALL]
+"""
+
+try:
+    import apsw
+except:
+    from letmedoit.utils.install import *
+    installmodule(f"--upgrade apsw")
+from letmedoit import config
+from letmedoit.health_check import HealthCheck
+from letmedoit.utils.file_utils import FileUtil
+from letmedoit.utils.embedding_service import EmbeddingService
+from letmedoit.plugins.bibleTools.utils.BibleBooks import BibleBooks
+from letmedoit.plugins.bibleTools.utils.BibleDatabase import BibleDatabase
+from chromadb.config import Settings
+from prompt_toolkit import print_formatted_text, HTML
+import os, re, json, chromadb
+
+# use the same bible data as plugin "bible"
+if not hasattr(config, "bibleDataCurrent"):
+    config.bibleDataCurrent = config.bibleData if getattr(config, "bibleData", "") else os.path.join(config.letMeDoItAIFolder, "plugins", "bibleTools", "bibleData")
+
+abbrev = BibleBooks.abbrev["eng"]
+# map both abbreviations and full names to abbreviations stored in metadata
+bookAbbreviations = {}
+for i in abbrev:
+    abb, fullname = abbrev[i]
+    if abb:
+        bookAbbreviations[abb.lower()] = abb
+        bookAbbreviations[fullname.lower()] = abb
+
+def getChromadbBibleList():
+    return FileUtil.fileNamesWithoutExtension(os.path.join(config.bibleDataCurrent, "bibles"), "bible")
+
+def getChromaFolder(version):
+    return os.path.join(config.getStorageDir(), "bibles", version)
+
+def getCollection(version):
+    chroma_client = chromadb.PersistentClient(getChromaFolder(version), Settings(anonymized_telemetry=False))
+    collection = chroma_client.get_or_create_collection(
+        name="verses",
+        metadata={"hnsw:space": "cosine"},
+        embedding_function=HealthCheck.getEmbeddingFunction(embeddingModel=config.embeddingModel),
+    )
+    return chroma_client, collection
+
+def loadProgress(version):
+    try:
+        with open(os.path.join(getChromaFolder(version), "progress.json"), "r", encoding="utf-8") as fileObj:
+            return json.load(fileObj)
+    except:
+        return {}
+
+def saveProgress(version, progress):
+    with open(os.path.join(getChromaFolder(version), "progress.json"), "w", encoding="utf-8") as fileObj:
+        json.dump(progress, fileObj)
+
+def convert_bible_to_chromadb(version):
+    # return True when all verses of a bible module are stored in its chromadb collection
+    connection = BibleDatabase.getConnection(version)
+    if connection is None:
+        return False
+    stat = os.stat(BibleDatabase.getDatabase(version))
+    key = [stat.st_size, stat.st_mtime_ns, config.embeddingModel]
+    progress = loadProgress(version)
+    if progress.get("key") == key and progress.get("completed"):
+        return True
+    os.makedirs(getChromaFolder(version), exist_ok=True)
+    chroma_client, collection = getCollection(version)
+    if not progress.get("key") == key:
+        # bible module or embedding model is changed
+        chroma_client.delete_collection("verses")
+        chroma_client, collection = getCollection(version)
+        progress = {"key": key, "converted": 0, "completed": False}
+        saveProgress(version, progress)
+    verses = connection.cursor().execute("SELECT Book, Chapter, Verse, Scripture FROM Verses WHERE Scripture<>'' ORDER BY Book, Chapter, Verse").fetchall()
+    total = len(verses)
+    batchSize = config.chromadbBibleBatchSize
+    if hasattr(chroma_client, "max_batch_size"):
+        batchSize = min(batchSize, chroma_client.max_batch_size)
+    config.print2(f"Converting bible {version} into chromadb collection ...")
+    for start in range(progress["converted"], total, batchSize):
+        batch = verses[start:start + batchSize]
+        documents = [re.sub("<[^<>]*?>", "", scripture).strip() for *_, scripture in batch]
+        collection.upsert(
+            ids=[f"{b}.{c}.{v}" for b, c, v, _ in batch],
+            # verses are embedded with the model shared in the current process
+            embeddings=[list(i) for i in EmbeddingService.embed(documents, embeddingModel=config.embeddingModel)],
+            documents=documents,
+            metadatas=[{"book": b, "book_abbr": abbrev[str(b)][0] if str(b) in abbrev else str(b), "chapter": c, "verse": v} for b, c, v, _ in batch],
+        )
+        # conversion resumes from here if it is interrupted
+        progress["converted"] = start + len(batch)
+        saveProgress(version, progress)
+        config.print(f"{progress['converted']}/{total} verses converted")
+    progress["completed"] = True
+    saveProgress(version, progress)
+    config.print2("Converted!")
+    return True
+
+def getWhereDocument(contains):
+    # e.g. "love||faith&&hope" searches for verses containing "love", or both "faith" and "hope"
+    def getAndItems(query):
+        splits = [i for i in query.split("&&") if i]
+        return {"$and": [{"$contains": i} for i in splits]} if len(splits) > 1 else {"$contains": splits[0]}
+    splits = [i for i in contains.split("||") if i.strip()]
+    if not splits:
+        return None
+    return {"$or": [getAndItems(i) for i in splits]} if len(splits) > 1 else getAndItems(splits[0])
+
+def semantic_bible_search(function_args):
+    meaning = function_args.get("meaning", "") # required
+    version = function_args.get("version", "")
+    if not version in getChromadbBibleList():
+        version = getattr(config, "mainText", "NET")
+    books = function_args.get("books", [])
+    if isinstance(books, str):
+        books = re.split("[,;]|\|\|", books)
+    books = [i.strip(" '\"[]").lower() for i in books]
+    books = [bookAbbreviations[i] for i in books if i in bookAbbreviations]
+    contains = function_args.get("contains", "")
+    regex = function_args.get("regex", "")
+    # reject a search without criteria, which would otherwise return all verses of a bible
+    if not (meaning.strip() or books or contains.strip() or regex):
+        return "[INVALID]"
+
+    config.stopSpinning()
+    if not convert_bible_to_chromadb(version):
+        return "[INVALID]"
+    _, collection = getCollection(version)
+    # stage 1 & 2: vector search, filtered by books and literal text in chromadb
+    where = ({"book_abbr": {"$in": books}} if len(books) > 1 else {"book_abbr": books[0]}) if books else None
+    whereDocument = getWhereDocument(contains) if contains else None
+    if meaning:
+        res = collection.query(
+            query_texts=[meaning],
+            n_results=config.semanticBibleSearchResults,
+            where=where,
+            where_document=whereDocument,
+        )
+        metadatas, documents = res["metadatas"][0], res["documents"][0]
+    else:
+        res = collection.get(
+            where=where,
+            where_document=whereDocument,
+        )
+        # sort in canonical order
+        results = sorted(zip(res["metadatas"], res["documents"]), key=lambda i: (i[0]["book"], i[0]["chapter"], i[0]["verse"]))
+        metadatas, documents = [i for i, _ in results], [i for _, i in results]
+    # stage 3: regular expression
+    if regex:
+        try:
+            pattern = re.compile(regex, flags=0 if getattr(config, "enableCaseSensitiveSearch", False) else re.IGNORECASE)
+        except:
+            pattern = re.compile(re.escape(regex), flags=re.IGNORECASE)
+    info = {}
+    config.print(config.divider)
+    for metadata, document in zip(metadatas, documents):
+        if regex and not pattern.search(document):
+            continue
+        ref = f"""{metadata["book_abbr"]} {metadata["chapter"]}:{metadata["verse"]}"""
+        info[ref] = document
+        print_formatted_text(HTML(f"<{config.terminalResourceLinkColor}>({ref})</{config.terminalResourceLinkColor}> {document}"))
+    config.print(config.divider)
+    config.print(f"Total: {len(info)} verse(s)")
+    return json.dumps(info)
+
+functionSignature = {
+    "name": "semantic_bible_search",
+    "description": "Search for bible verses by meaning, optionally filtered by bible books, literal text or regular expression",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "meaning": {
+                "type": "string",
+                "description": "Meaning of the verses to search for. Answer '' if only literal text or regular expression is given.",
+            },
+            "version": {
+                "type": "string",
+                "description": "Bible version to search. Answer '' if none is specified.",
+            },
+            "books": {
+                "type": "string",
+                "description": """List of bible books to search in, using SBL abbreviations, e.g. "['Gen', 'Matt', 'John']". Answer "[]" if no book is specified.""",
+            },
+            "contains": {
+                "type": "string",
+                "description": "Literal text that the verses contain; use '||' to separate alternatives and '&&' to require all, e.g. 'love&&faith'. Answer '' if none is specified.",
+            },
+            "regex": {
+                "type": "string",
+                "description": "Python regular expression that the verses match. Answer '' if none is specified.",
+            },
+        },
+        "required": ["meaning"],
+    },
+}
+
+# configs particular to this plugin
+# persistent
+persistentConfigs = (
+    ("chromadbBibleBatchSize", 1024), # number of verses embedded and stored at a time
+    ("semanticBibleSearchResults", 20),
+)
+config.setConfig(persistentConfigs)
+
+config.pluginsWithFunctionCall.append("semantic_bible_search")
+config.chatGPTApiFunctionSignatures.append(functionSignature)
+config.chatGPTApiAvailableFunctions["semantic_bible_search"] = semantic_bible_search
@@ -11,7 +11,7 @@ import openai, os
 from base64 import b64decode
 from letmedoit.utils.shared_utils import SharedUtil
 from letmedoit.utils.terminal_mode_dialogs import TerminalModeDialogs
-from openai import OpenAI
+from letmedoit.utils.openai_client import OpenAIClient
 from pathlib import Path
 
 def create_image(function_args):
@@ -42,7 +42,7 @@ def create_image(function_args):
     try:
         # get responses
         #https://platform.openai.com/docs/guides/images/introduction
-        response = OpenAI().images.generate(
+        response = OpenAIClient.getClient().images.generate(
             model="dall-e-3",
             prompt=f"I NEED to test how the tool works with extremely simple prompts. DO NOT add any detail, just use it AS-IS:\n{prompt}",
             size=size,
@@ -33,6 +33,7 @@ def integrate_google_searches(function_args):
 
 functionSignature = {
     "name": "integrate_google_searches",
+    "parallel_safe": True,
     "description": "Search internet for keywords when ChatGPT lacks information or when user ask about news or latest updates",
     "parameters": {
         "type": "object",
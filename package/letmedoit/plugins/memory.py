@@ -10,9 +10,10 @@ modified from source: https://medium.com/@simon_attard/building-a-memory-layer-f
 
 from letmedoit import config
 from letmedoit.health_check import HealthCheck
+from letmedoit.utils.device_info import DeviceInfo
 from pathlib import Path
 from chromadb.config import Settings
-import uuid, os, chromadb, getpass, geocoder, datetime, json
+import uuid, os, chromadb, getpass, datetime, json
 import numpy as np
 from numpy.linalg import norm
 
@@ -48,14 +49,15 @@ def save_memory(function_args):
     if not isinstance(memory_tags, str):
         memory_tags = str(memory_tags)
     collection = get_or_create_collection("memories")
-    g = geocoder.ip('me')
+    # last known location, which is refreshed in background
+    location = DeviceInfo.getLocation()
     metadata = {
         "timestamp": str(datetime.datetime.now()),
         "tags": memory_tags,
         "title": memory_title,
         "type": memory_type,
         "user": getpass.getuser(),
-        "location": f"{g.city}, {g.state}, {g.country}",
+        "location": f"{location['city']}, {location['state']}, {location['country']}",
     }
     if config.developer:
         config.print(config.divider)
@@ -120,6 +122,7 @@ functionSignature1 = {
 }
 functionSignature2 = {
     "name": "retrieve_memories",
+    "parallel_safe": True,
     "description": """Use this function to query and retrieve memories of important conversation snippets that we had in the past. Use this function if the information you require is not in the current prompt or you need additional information to refresh your memory.""",
     "parameters": {
         "type": "object",
@@ -8,7 +8,7 @@ modify the given images according to changes specified by users
 
 from letmedoit import config
 import openai, os
-from openai import OpenAI
+from letmedoit.utils.openai_client import OpenAIClient
 from letmedoit.utils.shared_utils import SharedUtil
 from letmedoit.utils.terminal_mode_dialogs import TerminalModeDialogs
 from pathlib import Path
@@ -66,7 +66,7 @@ def get_description(filename):
         content.insert(0, {"type": "text", "text": "Describe this image in as much detail as possible, including color patterns, positions and orientations of all objects and backgrounds in the image",})
         #print(content)
         try:
-            response = OpenAI().chat.completions.create(
+            response = OpenAIClient.getClient().chat.completions.create(
                 model="gpt-4-vision-preview",
                 messages=[
                     {
@@ -135,7 +135,7 @@ def create_image(description, original_filename):
     try:
         # get responses
         #https://platform.openai.com/docs/guides/images/introduction
-        response = OpenAI().images.generate(
+        response = OpenAIClient.getClient().images.generate(
             model="dall-e-3",
             prompt=f"I NEED to test how the tool works with extremely simple prompts. DO NOT add any detail, just use it AS-IS:\n{description}",
             size=size,
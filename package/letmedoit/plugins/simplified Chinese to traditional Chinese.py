@@ -13,10 +13,18 @@ except:
 from letmedoit import config
 from opencc import OpenCC
 
-def convertToTraditionalChinese(text):
-    if text:
-        return OpenCC('s2t').convert(text)
-    else:
-        return text
+class TraditionalChineseConverter:
 
-config.chatGPTTransformers.append(convertToTraditionalChinese)
\ No newline at end of file
+    def __init__(self):
+        # conversion dictionaries are loaded once only
+        self.converter = OpenCC('s2t')
+
+    def __call__(self, text):
+        if text:
+            return self.converter.convert(text)
+        else:
+            return text
+
+convertToTraditionalChinese = TraditionalChineseConverter()
+
+config.chatGPTTransformers.append(convertToTraditionalChinese)
@@ -1,6 +1,6 @@
 from letmedoit import config
-import openai, threading, os, time, traceback, re, subprocess, json, pydoc, textwrap, string, shutil, asyncio, datetime, pprint
-from openai import OpenAI
+import openai, threading, concurrent.futures, os, time, traceback, re, subprocess, json, pydoc, textwrap, string, shutil, asyncio, datetime, pprint
+from letmedoit.utils.openai_client import OpenAIClient
 try:
     import tiktoken
     tiktokenImported = True
@@ -16,13 +16,14 @@ from prompt_toolkit import PromptSession
 from prompt_toolkit.history import FileHistory
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.shortcuts import clear
-from prompt_toolkit.application import run_in_terminal
+from prompt_toolkit.application import run_in_terminal, get_app
 from prompt_toolkit import print_formatted_text, HTML
 from prompt_toolkit.input import create_input
 from prompt_toolkit.keys import Keys
 from letmedoit.utils.terminal_mode_dialogs import TerminalModeDialogs
 from letmedoit.utils.prompts import Prompts
 from letmedoit.utils.promptValidator import FloatValidator, TokenValidator
+from letmedoit.utils.token_estimator import TokenEstimator
 from letmedoit.utils.get_path_prompt import GetPath
 from letmedoit.utils.prompt_shared_key_bindings import swapTerminalColors
 from letmedoit.utils.file_utils import FileUtil
@@ -30,6 +31,14 @@ from letmedoit.utils.terminal_system_command_prompt import SystemCommandPrompt
 from letmedoit.utils.shared_utils import SharedUtil
 from letmedoit.utils.tts_utils import TTSUtil
 from letmedoit.utils.streaming_word_wrapper import StreamingWordWrapper
+from letmedoit.utils.plugin_registry import PluginRegistry
+from letmedoit.utils.embedding_service import EmbeddingService
+from letmedoit.utils.text_wrapper import TextWrapper
+from letmedoit.utils.tool_router import ToolRouter
+from letmedoit.utils.context_compactor import ContextCompactor
+from letmedoit.utils.response_cache import ResponseCache
+from letmedoit.utils.python_worker import PythonWorker
+from letmedoit.utils.device_info import DeviceInfo
 from letmedoit.plugins.bibleTools.utils.TextUtil import TextUtil
 if not config.isTermux:
     from letmedoit.autobuilder import AutoGenBuilder
@@ -39,10 +48,18 @@ class LetMeDoItAI:
 
     def __init__(self):
         #config.letMeDoItAI = self
+        # look up location in background, before it is used in system message
+        DeviceInfo.warmUp()
         self.prompts = Prompts()
         self.dialogs = TerminalModeDialogs(self)
         self.setup()
         self.runPlugins()
+        # load embedding model in background, if it is used by enabled plugins or tool routing
+        if not config.isTermux and (not "memory" in config.pluginExcludeList or ToolRouter.isEnabled()):
+            EmbeddingService.warmUp()
+        # start python worker in background
+        if config.pythonWorker:
+            PythonWorker.warmUp()
 
     def setup(self):
         self.models = list(SharedUtil.tokenLimits.keys())
@@ -206,9 +223,11 @@ class LetMeDoItAI:
                 else:
                     with open(script, 'r', encoding='utf8') as f:
                         runCode(f.read())
+                return True
             except:
                 self.print("Failed to run '{0}'!".format(os.path.basename(script)))
                 SharedUtil.showErrors()
+        return False
 
     def runPlugins(self):
         # The following config values can be modified with plugins, to extend functionalities
@@ -238,10 +257,14 @@ class LetMeDoItAI:
             pluginFolders = (pluginFolder, customPluginFoler)
         else:
             pluginFolders = (pluginFolder,)
+        # plugins are registered from a cached manifest and imported on their first function call
+        if not hasattr(self, "pluginRegistry"):
+            manifestFile = os.path.join(self.storageDir if self.storageDir else config.letMeDoItAIFolder, "plugins_manifest.json")
+            self.pluginRegistry = PluginRegistry(self.execPythonFile, manifestFile, globals())
         # always run 'integrate google searches'
         internetSeraches = "integrate google searches"
         script = os.path.join(pluginFolder, "{0}.py".format(internetSeraches))
-        self.execPythonFile(script)
+        self.pluginRegistry.runPlugin(script)
         # always include the following plugins
         requiredPlugins = ("auto heal python code",)
         for i in requiredPlugins:
@@ -252,7 +275,8 @@ class LetMeDoItAI:
             for plugin in FileUtil.fileNamesWithoutExtension(folder, "py"):
                 if not plugin in config.pluginExcludeList:
                     script = os.path.join(folder, "{0}.py".format(plugin))
-                    self.execPythonFile(script)
+                    self.pluginRegistry.runPlugin(script)
+        self.pluginRegistry.saveManifest()
         if internetSeraches in config.pluginExcludeList:
             del config.chatGPTApiFunctionSignatures[0]
         self.setupPythonExecution()
@@ -311,7 +335,7 @@ class LetMeDoItAI:
     def setAPIkey(self):
         # instantiate a client that can shared with plugins
         os.environ["OPENAI_API_KEY"] = config.openaiApiKey
-        self.client = OpenAI()
+        self.client = OpenAIClient.getClient()
         # set variable 'OAI_CONFIG_LIST' to work with pyautogen
         oai_config_list = []
         for model in self.models:
@@ -564,14 +588,16 @@ Answer "chat" if I explicitly ask you "do not execute" or if I start my request
 Otherwise, answer "chat". Here is the request:"""
 
         messagesCopy.append({"role": "user", "content": f"{context} {userInput}"})
-        completion = self.client.chat.completions.create(
-            model=config.chatGPTApiModel,
-            messages=messagesCopy,
-            n=1,
-            temperature=0.0,
-            max_tokens=SharedUtil.getDynamicTokens(messagesCopy),
-        )
-        answer = completion.choices[0].message.content
+        def getScreeningResponse():
+            completion = self.client.chat.completions.create(
+                model=config.chatGPTApiModel,
+                messages=messagesCopy,
+                n=1,
+                temperature=0.0,
+                max_tokens=SharedUtil.getDynamicTokens(messagesCopy),
+            )
+            return completion.choices[0].message.content
+        answer = ResponseCache.getResponse(ResponseCache.getKey(config.chatGPTApiModel, 0.0, messagesCopy), getScreeningResponse)
         self.screenAction = answer = re.sub("[^A-Za-z]", "", answer).lower()
 
         self.print("screening done!")
@@ -621,24 +647,31 @@ Otherwise, answer "chat". Here is the request:"""
             return messagesCopy
         return messages
 
-    def getFunctionMessageAndResponse(self, messages, functionSignatures, function_name, temperature=None):
-        completion = self.client.chat.completions.create(
-            model=config.chatGPTApiModel,
-            messages=messages,
-            max_tokens=SharedUtil.getDynamicTokens(messages, functionSignatures),
-            temperature=temperature if temperature is not None else config.llmTemperature,
-            n=1,
-            tools=SharedUtil.convertFunctionSignaturesIntoTools(functionSignatures),
-            tool_choice={"type": "function", "function": {"name": function_name}},
-        )
-        function_call_message = completion.choices[0].message
-        tool_call = function_call_message.tool_calls[0]
-        func_arguments = tool_call.function.arguments
+    def getFunctionMessageAndResponse(self, messages, functionSignatures, function_name, temperature=None, useCache=False):
+        # useCache: reuse function arguments generated at temperature 0 for the same messages, see config.responseCache
+        temperature = temperature if temperature is not None else config.llmTemperature
+        tools = SharedUtil.convertFunctionSignaturesIntoTools(functionSignatures)
+        def getFunctionCall():
+            completion = self.client.chat.completions.create(
+                model=config.chatGPTApiModel,
+                messages=messages,
+                max_tokens=SharedUtil.getDynamicTokens(messages, functionSignatures),
+                temperature=temperature,
+                n=1,
+                tools=tools,
+                tool_choice={"type": "function", "function": {"name": function_name}},
+            )
+            tool_call = completion.choices[0].message.tool_calls[0]
+            return [tool_call.function.name, tool_call.function.arguments]
+        if useCache:
+            func_name, func_arguments = ResponseCache.getResponse(ResponseCache.getKey(config.chatGPTApiModel, temperature, messages, tools), getFunctionCall, temperature)
+        else:
+            func_name, func_arguments = getFunctionCall()
         function_call_message_mini = {
             "role": "assistant",
             "content": "",
             "function_call": {
-                "name": tool_call.function.name,
+                "name": func_name,
                 "arguments": func_arguments,
             }
         }
@@ -679,16 +712,15 @@ Otherwise, answer "chat". Here is the request:"""
                 if not confirmation.lower() in ("y", "yes"):
                     info = {"information": python_code}
                     return json.dumps(info)
-            try:
-                exec(refinedCode, globals())
-                function_response = SharedUtil.getPythonFunctionResponse(refinedCode)
-            except:
-                trace = SharedUtil.showErrors()
+            trace = SharedUtil.runPythonCode(refinedCode)
+            if trace:
+                SharedUtil.showErrors(trace)
                 self.print(self.divider)
                 if config.max_consecutive_auto_heal > 0:
                     return SharedUtil.autoHealPythonCode(refinedCode, trace)
                 else:
                     return "[INVALID]"
+            function_response = SharedUtil.getPythonFunctionResponse(refinedCode)
             if function_response:
                 info = {"information": function_response}
                 function_response = json.dumps(info)
@@ -713,19 +745,47 @@ Otherwise, answer "chat". Here is the request:"""
             function_response = fuction_to_call(function_args)
         return function_response
 
+    def getParallelFunctionResponses(self, function_calls, toolArguments):
+        # run functions marked with "parallel_safe" in their signatures on a thread pool and wait for all of them
+        # return futures of their responses, keyed by tool call index
+        # other functions, e.g. those asking for confirmation, are called one by one afterwards
+        parallelSafeFunctions = {i.get("name", "") for i in config.chatGPTApiFunctionSignatures if i.get("parallel_safe", False)}
+        calls = [func for func in function_calls if func.function.name in parallelSafeFunctions]
+        if len(calls) < 2 or config.maxParallelFunctionCalls < 2:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(calls), config.maxParallelFunctionCalls)) as executor:
+            return {func.index: executor.submit(self.getFunctionResponse, toolArguments[func.index], func.function.name) for func in calls}
+
     def runCompletion(self, thisMessage, noFunctionCall=False):
         self.functionJustCalled = False
+        # send only functions relevant to the latest user input
+        functionSignatures = config.chatGPTApiFunctionSignatures
+        # the same functions are sent with every request when config.stablePromptPrefix is enabled
+        if functionSignatures and not noFunctionCall and not config.stablePromptPrefix:
+            userInput = next((i.get("content", "") for i in reversed(thisMessage) if i.get("role", "") == "user"), "")
+            functionSignatures = ToolRouter.selectSignatures(functionSignatures, userInput if isinstance(userInput, str) else "", (config.runSpecificFuntion,))
         def runThisCompletion(thisThisMessage):
-            if config.chatGPTApiFunctionSignatures and not self.functionJustCalled and not noFunctionCall:
+            withFunctions = (functionSignatures and not self.functionJustCalled and not noFunctionCall)
+            # keep long conversations within the token budget, instead of starting a new chat
+            thisThisMessage[:] = ContextCompactor.compact(thisThisMessage, functionSignatures if withFunctions else None, self.getCurrentContext())
+            if config.stablePromptPrefix:
+                # volatile information goes after the stable prefix; it is not kept in conversation history
+                thisThisMessage = thisThisMessage + [self.getCurrentStateMessage()]
+                # ask for token usage to report prompt cache hits
+                extra_body = {"stream_options": {"include_usage": True}}
+            else:
+                extra_body = None
+            if withFunctions:
                 return self.client.chat.completions.create(
                     model=config.chatGPTApiModel,
                     messages=thisThisMessage,
                     n=1,
                     temperature=config.llmTemperature,
-                    max_tokens=SharedUtil.getDynamicTokens(thisThisMessage, config.chatGPTApiFunctionSignatures),
-                    tools=SharedUtil.convertFunctionSignaturesIntoTools(config.chatGPTApiFunctionSignatures),
+                    max_tokens=SharedUtil.getDynamicTokens(thisThisMessage, functionSignatures),
+                    tools=SharedUtil.convertFunctionSignaturesIntoTools(functionSignatures),
                     tool_choice={"type": "function", "function": {"name": config.runSpecificFuntion}} if config.runSpecificFuntion else config.chatGPTApiFunctionCall,
                     stream=True,
+                    extra_body=extra_body,
                 )
             return self.client.chat.completions.create(
                 model=config.chatGPTApiModel,
@@ -734,6 +794,7 @@ Otherwise, answer "chat". Here is the request:"""
                 temperature=config.llmTemperature,
                 max_tokens=SharedUtil.getDynamicTokens(thisThisMessage),
                 stream=True,
+                extra_body=extra_body,
             )
 
         while True:
@@ -760,6 +821,8 @@ Otherwise, answer "chat". Here is the request:"""
 
                 func_responses = ""
                 bypassFunctionCall = False
+                # parallel-safe functions are called concurrently, before the others
+                parallelResponses = self.getParallelFunctionResponses(function_calls, toolArguments)
                 # handle function calls
                 for func in function_calls:
                     func_index = func.index
@@ -768,7 +831,7 @@ Otherwise, answer "chat". Here is the request:"""
                     func_arguments = toolArguments[func_index]
 
                     # get function response
-                    func_response = self.getFunctionResponse(func_arguments, func_name)
+                    func_response = parallelResponses[func_index].result() if func_index in parallelResponses else self.getFunctionResponse(func_arguments, func_name)
 
                     # "[INVALID]" practically mean that it ignores previously called function and continues chat without function calling
                     if func_response == "[INVALID]":
@@ -822,9 +885,9 @@ Otherwise, answer "chat". Here is the request:"""
         systemMessage = config.customSystemMessage if config.customSystemMessage else f'''You’re {config.letMeDoItName}, an advanced AI assistant, capable of both engaging in conversations and executing codes on my device.
 I am providing the basic information of my device below in case you need it:
 ```
-{SharedUtil.getDeviceInfo()}
+{SharedUtil.getDeviceInfo(includeCurrentState=not config.stablePromptPrefix)}
 ```
-Please use the current time and date that I have provided above as a reference point for any relative dates and times mentioned in my prompt.
+Please use the current time and date that I have provided {"at the end of our conversation" if config.stablePromptPrefix else "above"} as a reference point for any relative dates and times mentioned in my prompt.
 You have all the necessary permissions to execute system commands and Python code on my behalf. Your functionality expands as I add more plugins to you. You respond to my prompts and perform tasks based on your own knowledge, the context I provide, as well as the additional knowledge and capabilities provided by plugins.
 
 When replying to my requests, please follow these steps:
@@ -842,6 +905,10 @@ Always remember that you are much more than a text-based AI. You possess both vi
 
     # update system message
     def updateSystemMessage(self, messages):
+        # system message is kept unchanged at the front, to make use of provider prompt caching
+        # current directory and time are sent in a trailing message instead, see getCurrentStateMessage
+        if config.stablePromptPrefix:
+            return messages
         for index, message in enumerate(messages):
             try:
                 if message.get("role", "") == "system":
@@ -864,6 +931,9 @@ Always remember that you are much more than a text-based AI. You possess both vi
                 pass
         return messages
 
+    def getCurrentStateMessage(self):
+        return {"role": "system", "content": SharedUtil.getCurrentState()}
+
     def getCurrentContext(self):
         if not config.predefinedContext in config.predefinedContexts:
             self.print2(f"'{config.predefinedContext}' not defined!")
@@ -1547,6 +1617,10 @@ Always remember that you are much more than a text-based AI. You possess both vi
     def startChats(self):
         tokenValidator = TokenValidator()
         def getDynamicToolBar():
+            # toolbar is rendered after every edit; tokens are counted in background and the toolbar is refreshed when they are ready
+            if config.dynamicTokenCount and tiktokenImported:
+                app = get_app()
+                TokenEstimator.request(app.current_buffer.text, app)
             return config.dynamicToolBarText
         def startChat():
             clear()
@@ -1569,6 +1643,7 @@ Always remember that you are much more than a text-based AI. You possess both vi
         while True:
             # default toolbar text
             config.dynamicToolBarText = " [ctrl+q] exit [ctrl+k] shortcut keys "
+            TokenEstimator.reset()
             # display current directory if changed
             currentDirectory = os.getcwd()
             if not currentDirectory == storagedirectory:
@@ -1588,7 +1663,7 @@ Always remember that you are much more than a text-based AI. You possess both vi
             # input suggestions
             inputSuggestions = config.inputSuggestions[:] + self.getDirectoryList() if config.developer else config.inputSuggestions
             completer = WordCompleter(inputSuggestions, ignore_case=True) if inputSuggestions else None
-            userInput = self.prompts.simplePrompt(promptSession=self.terminal_chat_session, completer=completer, default=defaultEntry, accept_default=accept_default, validator=tokenValidator, bottom_toolbar=getDynamicToolBar)
+            userInput = self.prompts.simplePrompt(promptSession=self.terminal_chat_session, completer=completer, default=defaultEntry, accept_default=accept_default, validator=tokenValidator, bottom_toolbar=getDynamicToolBar, validate_while_typing=False)
             
             # update system message when user enter a new input
             config.currentMessages = self.updateSystemMessage(config.currentMessages)
@@ -1703,7 +1778,7 @@ Always remember that you are much more than a text-based AI. You possess both vi
             elif userInput and not userInputLower in featuresLower:
                 try:
                     if userInput and config.ttsInput:
-                        TTSUtil.play(userInput)
+                        TTSUtil.playInBackground(userInput)
                     # Feature: improve writing:
                     specialEntryPattern = "\[CALL_[^\[\]]*?\]|\[NO_FUNCTION_CALL\]|\[NO_SCREENING\]"
                     specialEntry = re.search(specialEntryPattern, userInput)
@@ -1724,7 +1799,7 @@ My writing:
                             self.print(improvedVersion)
                             userInput = improvedVersion[3:-3]
                             if config.ttsOutput:
-                                TTSUtil.play(userInput)
+                                TTSUtil.playInBackground(userInput)
                     if specialEntry:
                         userInput = f"{userInput}{specialEntry}"
                     # refine messages before running completion
@@ -1856,74 +1931,7 @@ My writing:
 
     # wrap html text at spaces
     def getWrappedHTMLText(self, text, terminal_width=None):
-        if not " " in text:
-            return text
-        if terminal_width is None:
-            terminal_width = shutil.get_terminal_size().columns
-        self.wrappedText = ""
-        self.lineWidth = 0
-
-        def addWords(words):
-            words = words.split(" ")
-            for index, item in enumerate(words):
-                isLastItem = (len(words) - index == 1)
-                if SharedUtil.is_CJK(item):
-                    for iIndex, i in enumerate(item):
-                        isSpaceItem = (not isLastItem and (len(item) - iIndex == 1))
-                        iWidth = SharedUtil.getStringWidth(i)
-                        if isSpaceItem:
-                            newLineWidth = self.lineWidth + iWidth + 1
-                        else:
-                            newLineWidth = self.lineWidth + iWidth
-                        if newLineWidth > terminal_width:
-                            self.wrappedText += f"\n{i} " if isSpaceItem else f"\n{i}"
-                            self.lineWidth = iWidth + 1 if isSpaceItem else iWidth
-                        else:
-                            self.wrappedText += f"{i} " if isSpaceItem else i
-                            self.lineWidth += iWidth + 1 if isSpaceItem else iWidth
-                else:
-                    itemWidth = SharedUtil.getStringWidth(item)
-                    if isLastItem:
-                        newLineWidth = self.lineWidth + itemWidth
-                    else:
-                        newLineWidth = self.lineWidth + itemWidth + 1
-                    if newLineWidth > terminal_width:
-                        self.wrappedText += f"\n{item}" if isLastItem else f"\n{item} "
-                        self.lineWidth = itemWidth if isLastItem else itemWidth + 1
-                    else:
-                        self.wrappedText += item if isLastItem else f"{item} "
-                        self.lineWidth += itemWidth if isLastItem else itemWidth + 1
-
-        def processLine(lineText):
-            if re.search("<[^<>]+?>", lineText):
-                # handle html/xml tags
-                chunks = lineText.split(">")
-                totalChunks = len(chunks)
-                for index, chunk in enumerate(chunks):
-                    isLastChunk = (totalChunks - index == 1)
-                    if isLastChunk:
-                        addWords(chunk)
-                    else:
-                        tag = True if "<" in chunk else False
-                        if tag:
-                            nonTag, tagContent = chunk.rsplit("<", 1)
-                            addWords(nonTag)
-                            self.wrappedText += f"<{tagContent}>"
-                        else:
-                            addWords(f"{chunk}>")
-            else:
-                addWords(lineText)
-
-        lines = text.split("\n")
-        totalLines = len(lines)
-        for index, line in enumerate(lines):
-            isLastLine = (totalLines - index == 1)
-            processLine(line)
-            if not isLastLine:
-                self.wrappedText += "\n"
-                self.lineWidth = 0
-
-        return self.wrappedText
+        return TextWrapper.wrapHTMLText(text, terminal_width)
 
     def checkCompletion(self):
         self.setAPIkey()
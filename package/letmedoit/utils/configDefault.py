@@ -48,6 +48,8 @@ if config.isTermux:
 
 defaultSettings = (
     ('includeIpInSystemMessage', False),
+    ('deviceInfoTTL', 3600), # seconds to keep location and ip addresses before they are looked up again in background
+    ('deviceInfoTimeout', 5.0), # seconds to wait for location and ip addresses when they are not known yet
     ('translateToLanguage', ''),
     ('dynamicTokenCount', False),
     ('use_oai_assistant', False), # support OpenAI Assistants API in AutoGen Agent Builder
@@ -61,20 +63,44 @@ defaultSettings = (
     ('pagerView', False),
     ('usePygame', False),
     ('wrapWords', True),
+    ('streamingFrameRate', 30), # maximum number of terminal updates per second when streaming responses; set it to 0 to write every word immediately
     ('mouseSupport', False),
     ('autoUpgrade', True),
     ('chatGPTApiModel', 'gpt-3.5-turbo-16k'),
     ('chatGPTApiMaxTokens', 4000),
     ('chatGPTApiMinTokens', 256),
+    ('contextCompaction', True), # summarise or drop earlier messages when a conversation exceeds contextCompactionRatio of the token limit
+    ('contextCompactionRatio', 0.75), # maximum fraction of the token limit of the selected model used by messages and functions
+    ('contextCompactionKeepTurns', 3), # number of recent turns kept in full
+    ('contextCompactionMaxFunctionTokens', 500), # maximum number of tokens kept of each function response in compacted messages
+    ('contextCompactionSummary', True), # summarise dropped messages
+    ('stablePromptPrefix', False), # keep system message and functions unchanged across requests to make use of provider prompt caching; current directory and time are sent in a trailing message; disables toolRouting
+    ('localRiskAssessment', True), # grade risk of python code with static analysis, before asking the llm about ambiguous code
+    ('responseCache', True), # reuse responses of auxiliary requests made at temperature 0, e.g. risk assessment and screening, for the same input; requests, which include user input, and responses are stored in folder 'cache/responses' of the storage directory
+    ('responseCacheTTL', 604800), # seconds to keep cached responses
+    ('responseCacheMaxSize', 20), # maximum size, in MB, of cached responses
     #('chatGPTApiNoOfChoices', 1),
     ('chatGPTApiFunctionCall', "auto"),
+    ('toolRouting', False), # opt-in; send only functions relevant to user input, selected with config.embeddingModel; applies to local embedding models only, not text-embedding-ada-002; the embedding model is loaded in background on start when enabled
+    ('toolRoutingTopK', 8), # maximum number of relevant functions sent, in addition to core functions and the function specified with [CALL_function_name]
+    ('toolRoutingCoreFunctions', ["execute_python_code", "execute_termux_command"]), # functions always sent when function calling is enabled
     ('passFunctionCallReturnToChatGPT', True),
+    ('maxParallelFunctionCalls', 4), # maximum number of parallel-safe functions called concurrently when several are returned in one completion; set it to 1 to call functions one by one
     ('llmTemperature', 0.8),
     ('max_consecutive_auto_reply', 10), # work with pyautogen
     ('memoryClosestMatchesNumber', 5),
     ('runPythonScriptGlobally', False),
+    ('pythonWorker', True), # run python code generated by llm in a persistent worker process, instead of the chat process
+    ('pythonWorkerPreloadModules', ["os", "sys", "re", "json", "datetime", "math", "numpy", "pandas", "matplotlib.pyplot"]), # modules imported when the worker starts; modules not installed are skipped
+    ('pythonWorkerTimeout', 300), # seconds allowed for each python code execution; set it to 0 for no limit
+    ('pythonWorkerMemoryLimit', 0), # maximum data memory, in MB, of the worker process, e.g. 4096; not supported on Windows; 0 for no limit
+    ('autoHealCandidates', 1), # number of fixes requested in each auto-healing attempt; more than one fix are run in parallel in isolated python workers and the first successful one is used
     ('openaiApiKey', ''),
     ('openaiApiOrganization', ''),
+    ('openaiApiTimeout', 600.0), # seconds to wait for OpenAI api responses
+    ('openaiApiConnectTimeout', 5.0), # seconds to wait for a connection to OpenAI api
+    ('openaiApiMaxConnections', 20), # maximum number of pooled connections to OpenAI api
+    ('openaiApiKeepAlive', 60.0), # seconds to keep idle connections to OpenAI api open for reuse
     ('loadingInternetSearches', "auto"),
     ('maximumInternetSearchResults', 5),
     ('predefinedContext', '[none]'),
@@ -84,6 +110,7 @@ defaultSettings = (
     ('terminalEnableTermuxAPI', True if config.isTermux and isPackageInstalled("termux-open-url") else False),
     ('terminalEnableTermuxAPIToast', False),
     ('pluginExcludeList', pluginExcludeList),
+    ('lazyPluginLoading', True), # register plugins from a cached manifest and import them on their first function call
     ('cancel_entry', '.cancel'),
     ('exit_entry', '.exit'),
     ('terminalHeadingTextColor', 'ansigreen'),
@@ -114,6 +141,7 @@ defaultSettings = (
     ('gcttsSpeed', 1.0),
     ('gttsLang', "en"), # gTTS is used by default if ttsCommand is not given
     ('gttsTld', ""), # https://gtts.readthedocs.io/en/latest/module.html#languages-gtts-lang
+    ('ttsCacheMaxSize', 100), # maximum size, in MB, of cached speech audio; set it to 0 to disable tts audio cache
     ('ttsCommand', ""), # ttsCommand is used if it is given; offline tts engine runs faster; on macOS [suggested speak rate: 100-300], e.g. "say -r 200 -v Daniel"; on Ubuntu [espeak; speed in approximate words per minute; 175 by default], e.g. "espeak -s 175 -v en"; remarks: always place the voice option, if any, at the end
     ('ttsCommandSuffix', ""), # try on Windows; ttsComand = '''Add-Type -TypeDefinition 'using System.Speech.Synthesis; class TTS { static void Main(string[] args) { using (SpeechSynthesizer synth = new SpeechSynthesizer()) { synth.Speak(args[0]); } } }'; [TTS]::Main('''; ttsCommandSuffix = ")"; a full example is Add-Type -TypeDefinition 'using System.Speech.Synthesis; class TTS { static void Main(string[] args) { using (SpeechSynthesizer synth = new SpeechSynthesizer()) { synth.Speak(args[0]); } } }'; [TTS]::Main("Text to be read")
     ("ttsLanguages", ["en", "en-gb", "en-us", "zh", "yue", "el"]), # users can edit this item in config.py to support more or less languages
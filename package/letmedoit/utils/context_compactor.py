@@ -0,0 +1,136 @@
+from letmedoit import config
+from letmedoit.utils.shared_utils import SharedUtil
+from letmedoit.utils.token_ledger import TokenLedger
+try:
+    import tiktoken
+    tiktokenImported = True
+except:
+    tiktokenImported = False
+
+
+class ContextCompactor:
+
+    # earlier turns of a compacted conversation are replaced with an assistant message starting with summaryPrefix
+    summaryPrefix = "[Summary of our earlier conversation]\n"
+    # tokens reserved for the summary
+    summaryTokens = 500
+
+    @staticmethod
+    def getBudget(functionSignatures=None):
+        # maximum number of tokens of messages sent with a request
+        budget = int(SharedUtil.tokenLimits[config.chatGPTApiModel] * config.contextCompactionRatio)
+        if functionSignatures:
+            budget -= SharedUtil.count_tokens_from_functions(functionSignatures)
+        return max(budget, 0)
+
+    @staticmethod
+    def countMessageTokens(message):
+        return SharedUtil.count_tokens_from_messages([message]) - 3
+
+    @staticmethod
+    def isSummary(message):
+        content = message.get("content", "")
+        return message.get("role", "") == "assistant" and isinstance(content, str) and content.startswith(ContextCompactor.summaryPrefix)
+
+    @staticmethod
+    def truncateContent(message, maxTokens):
+        content = message.get("content", "")
+        if not isinstance(content, str) or not content:
+            return message
+        encoding = TokenLedger.getEncoding(config.chatGPTApiModel)
+        tokens = encoding.encode(content)
+        if len(tokens) <= maxTokens:
+            return message
+        message = dict(message)
+        message["content"] = f"{encoding.decode(tokens[:maxTokens])}\n[truncated]"
+        return message
+
+    @staticmethod
+    def compact(messages, functionSignatures=None, context=""):
+        # keep messages within config.contextCompactionRatio of the token limit of the selected model
+        # system messages, the message carrying the active context and the recent turns are kept
+        if not config.contextCompaction or not tiktokenImported:
+            return messages
+        budget = ContextCompactor.getBudget(functionSignatures)
+        total = SharedUtil.count_tokens_from_messages(messages)
+        if total <= budget:
+            return messages
+        originalTotal = total
+
+        userIndexes = [index for index, message in enumerate(messages) if message.get("role", "") == "user"]
+        keepTurns = max(config.contextCompactionKeepTurns, 1)
+        recentStart = userIndexes[-keepTurns] if len(userIndexes) >= keepTurns else (userIndexes[0] if userIndexes else len(messages))
+        contextIndex = -1
+        if context:
+            contextIndex = next((index for index in userIndexes if isinstance(messages[index].get("content", ""), str) and messages[index]["content"].startswith(context)), -1)
+        def isPinned(index, message):
+            return (message.get("role", "") == "system") or index >= recentStart or index == contextIndex
+
+        # step 1: truncate large function responses of earlier turns
+        messages = list(messages)
+        def truncateFunctionResponses(start, end):
+            nonlocal total
+            for index in range(start, end):
+                message = messages[index]
+                if message.get("role", "") in ("function", "tool"):
+                    truncated = ContextCompactor.truncateContent(message, config.contextCompactionMaxFunctionTokens)
+                    if not truncated is message:
+                        total -= ContextCompactor.countMessageTokens(message) - ContextCompactor.countMessageTokens(truncated)
+                        messages[index] = truncated
+        truncateFunctionResponses(0, recentStart)
+
+        # step 2: drop the oldest turns, which are summarised if config.contextCompactionSummary is enabled
+        dropped = []
+        if total > budget:
+            target = budget - ContextCompactor.summaryTokens if config.contextCompactionSummary else budget
+            for index in range(recentStart):
+                message = messages[index]
+                # stop at the beginning of a turn
+                if total <= target and message.get("role", "") == "user":
+                    break
+                if isPinned(index, message):
+                    continue
+                dropped.append(index)
+                total -= ContextCompactor.countMessageTokens(message)
+        if dropped:
+            summary = ContextCompactor.summarize([messages[index] for index in dropped]) if config.contextCompactionSummary else ""
+            droppedIndexes = set(dropped)
+            compacted = []
+            for index, message in enumerate(messages):
+                if index == dropped[0] and summary:
+                    compacted.append({"role": "assistant", "content": f"{ContextCompactor.summaryPrefix}{summary}"})
+                if not index in droppedIndexes:
+                    compacted.append(message)
+            recentStart -= len(dropped) - (1 if summary else 0)
+            messages = compacted
+            total = SharedUtil.count_tokens_from_messages(messages)
+
+        # step 3: truncate large function responses of recent turns
+        if total > budget:
+            truncateFunctionResponses(recentStart, len(messages))
+
+        if config.developer:
+            print(f"Conversation compacted: {originalTotal} -> {SharedUtil.count_tokens_from_messages(messages)} tokens")
+        return messages
+
+    @staticmethod
+    def summarize(messages):
+        conversation = []
+        for message in messages:
+            content = message.get("content", "")
+            if ContextCompactor.isSummary(message):
+                conversation.append(content[len(ContextCompactor.summaryPrefix):])
+            elif content and isinstance(content, str):
+                conversation.append(f"""{message.get("role", "")}: {content}""")
+        if not conversation:
+            return ""
+        # keep the latest part of the conversation if it is too long to be summarised at once
+        encoding = TokenLedger.getEncoding(config.chatGPTApiModel)
+        tokens = encoding.encode("\n\n".join(conversation))
+        maxTokens = SharedUtil.tokenLimits[config.chatGPTApiModel] // 2
+        conversation = encoding.decode(tokens[-maxTokens:])
+        return SharedUtil.getSingleChatResponse(f"""Summarise the following conversation between me and you in no more than 200 words.
+Keep names, file paths, decisions and results that may be referred to later.
+Provide me with the summary only, without any additional information or comments.
+Conversation:
+{conversation}""", temperature=0.0).strip()
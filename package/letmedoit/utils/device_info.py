@@ -0,0 +1,124 @@
+from letmedoit import config
+import platform, socket, getpass, threading, time, requests, netifaces, geocoder
+
+
+class DeviceInfo:
+
+    # information that does not change while LetMeDoIt AI is running, collected once
+    staticInfo = None
+    # location and ip addresses, refreshed in background every config.deviceInfoTTL seconds
+    location = None
+    locationTime = 0
+    ipInfo = None
+    ipTime = 0
+    # ip addresses are looked up only after they are requested
+    ipRequested = False
+    # seconds to wait before retrying a failed lookup
+    retryDelay = 60
+    thread = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def getStaticInfo():
+        if DeviceInfo.staticInfo is None:
+            DeviceInfo.staticInfo = {
+                "version": platform.version(),
+                "machine": platform.machine(),
+                "architecture": platform.architecture()[0],
+                "processor": platform.processor(),
+                "hostname": socket.gethostname(),
+                "username": getpass.getuser(),
+                "python_version": platform.python_version(),
+                "python_implementation": platform.python_implementation(),
+            }
+        return DeviceInfo.staticInfo
+
+    @staticmethod
+    def getWanIp():
+        try:
+            response = requests.get('https://api.ipify.org?format=json', timeout=5)
+            data = response.json()
+            return data['ip']
+        except:
+            return ""
+
+    @staticmethod
+    def getLocalIp():
+        interfaces = netifaces.interfaces()
+        for interface in interfaces:
+            addresses = netifaces.ifaddresses(interface)
+            if netifaces.AF_INET in addresses:
+                for address in addresses[netifaces.AF_INET]:
+                    ip = address['addr']
+                    if ip != '127.0.0.1':
+                        return ip
+
+    @staticmethod
+    def isStale(lastUpdate):
+        return time.time() - lastUpdate > config.deviceInfoTTL
+
+    @staticmethod
+    def refresh():
+        # look up location and ip addresses in background; only one lookup runs at a time
+        with DeviceInfo.lock:
+            if DeviceInfo.thread is not None and DeviceInfo.thread.is_alive():
+                return DeviceInfo.thread
+            DeviceInfo.thread = threading.Thread(target=DeviceInfo.runRefresh, daemon=True)
+            DeviceInfo.thread.start()
+            return DeviceInfo.thread
+
+    @staticmethod
+    def runRefresh():
+        if DeviceInfo.isStale(DeviceInfo.locationTime):
+            try:
+                g = geocoder.ip('me')
+                if not g.ok:
+                    raise ValueError(g.status)
+                DeviceInfo.location = {"latlng": g.latlng, "country": g.country, "state": g.state, "city": g.city}
+                DeviceInfo.locationTime = time.time()
+            except:
+                # keep the last known location
+                DeviceInfo.locationTime = time.time() - config.deviceInfoTTL + DeviceInfo.retryDelay
+        if DeviceInfo.ipRequested and DeviceInfo.isStale(DeviceInfo.ipTime):
+            try:
+                localIp = DeviceInfo.getLocalIp()
+            except:
+                localIp = None
+            DeviceInfo.ipInfo = {"wan": DeviceInfo.getWanIp(), "local": localIp}
+            DeviceInfo.ipTime = time.time()
+
+    @staticmethod
+    def warmUp():
+        DeviceInfo.refresh()
+
+    @staticmethod
+    def wait(timeout):
+        thread = DeviceInfo.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def getLocation(wait=False):
+        # return the last known location without waiting for a lookup, unless no location is known and wait is True
+        # values are None if location is not known
+        if DeviceInfo.isStale(DeviceInfo.locationTime):
+            DeviceInfo.refresh()
+            if wait and DeviceInfo.location is None:
+                DeviceInfo.wait(config.deviceInfoTimeout)
+        location = DeviceInfo.location
+        return location if location is not None else {"latlng": None, "country": None, "state": None, "city": None}
+
+    @staticmethod
+    def getIpInfo(wait=False):
+        # return the last known wan and local ip addresses; values are empty if they are not known
+        DeviceInfo.ipRequested = True
+        if DeviceInfo.isStale(DeviceInfo.ipTime):
+            DeviceInfo.refresh()
+            if wait and DeviceInfo.ipInfo is None:
+                DeviceInfo.wait(config.deviceInfoTimeout)
+                if DeviceInfo.ipInfo is None:
+                    # a running location lookup may not include ip addresses
+                    DeviceInfo.refresh()
+                    DeviceInfo.wait(config.deviceInfoTimeout)
+        ipInfo = DeviceInfo.ipInfo
+        return ipInfo if ipInfo is not None else {"wan": "", "local": ""}
@@ -0,0 +1,51 @@
+from letmedoit import config
+import threading
+
+
+class EmbeddingService:
+
+    # embedding functions shared in the current process, keyed by embedding model
+    embeddingFunctions = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def getEmbeddingFunction(embeddingModel=None):
+        embeddingModel = embeddingModel if embeddingModel is not None else config.embeddingModel
+        # OpenAI embedding function is bound to an api key
+        key = (embeddingModel, config.openaiApiKey) if embeddingModel == "text-embedding-ada-002" else (embeddingModel,)
+        # model weights are loaded once only, even when requested by different threads at the same time
+        with EmbeddingService.lock:
+            embeddingFunction = EmbeddingService.embeddingFunctions.get(key)
+            if embeddingFunction is None:
+                # import statement is placed here to make this file compatible on Android
+                from chromadb.utils import embedding_functions
+                if embeddingModel == "text-embedding-ada-002":
+                    embeddingFunction = embedding_functions.OpenAIEmbeddingFunction(api_key=config.openaiApiKey, model_name="text-embedding-ada-002")
+                else:
+                    # support custom Sentence Transformer Embedding models by modifying config.embeddingModel
+                    embeddingFunction = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=embeddingModel)
+                EmbeddingService.embeddingFunctions[key] = embeddingFunction
+        return embeddingFunction
+
+    @staticmethod
+    def embed(texts, batchSize=64, embeddingModel=None):
+        embeddingFunction = EmbeddingService.getEmbeddingFunction(embeddingModel)
+        embeddings = []
+        for i in range(0, len(texts), batchSize):
+            embeddings += list(embeddingFunction(texts[i:i + batchSize]))
+        return embeddings
+
+    @staticmethod
+    def warmUp(embeddingModel=None):
+        def loadModel():
+            try:
+                EmbeddingService.getEmbeddingFunction(embeddingModel)
+                # run a local model once, so that the first real request does not pay for initialisation
+                if not (embeddingModel or config.embeddingModel) == "text-embedding-ada-002":
+                    EmbeddingService.embed(["warm up"], embeddingModel=embeddingModel)
+            except:
+                if config.developer:
+                    print(f"Failed to load embedding model '{embeddingModel or config.embeddingModel}'!")
+        thread = threading.Thread(target=loadModel, daemon=True)
+        thread.start()
+        return thread
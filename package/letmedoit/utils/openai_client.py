@@ -0,0 +1,37 @@
+from letmedoit import config
+from openai import OpenAI
+import os, threading, httpx
+
+
+class OpenAIClient:
+
+    # one client, and its connection pool, is shared by core features and plugins
+    client = None
+    clientKey = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def getClient():
+        apiKey = getattr(config, "openaiApiKey", "") or os.environ.get("OPENAI_API_KEY", "")
+        # settings may be missing in config files created by earlier versions, which standalone tools load without defaults
+        apiTimeout = getattr(config, "openaiApiTimeout", 600.0)
+        connectTimeout = getattr(config, "openaiApiConnectTimeout", 5.0)
+        maxConnections = getattr(config, "openaiApiMaxConnections", 20)
+        keepAlive = getattr(config, "openaiApiKeepAlive", 60.0)
+        clientKey = (apiKey, apiTimeout, connectTimeout, maxConnections, keepAlive)
+        with OpenAIClient.lock:
+            # a new client is created only when api key or connection settings are changed
+            if OpenAIClient.client is None or not OpenAIClient.clientKey == clientKey:
+                timeout = httpx.Timeout(apiTimeout, connect=connectTimeout)
+                limits = httpx.Limits(
+                    max_connections=maxConnections,
+                    max_keepalive_connections=maxConnections,
+                    keepalive_expiry=keepAlive,
+                )
+                OpenAIClient.client = OpenAI(
+                    api_key=apiKey if apiKey else None,
+                    timeout=timeout,
+                    http_client=httpx.Client(timeout=timeout, limits=limits),
+                )
+                OpenAIClient.clientKey = clientKey
+            return OpenAIClient.client
@@ -0,0 +1,226 @@
+from letmedoit import config
+import os, sys, json, hashlib, threading
+
+
+class PluginRegistry:
+
+    # config items that plugins extend when they are executed
+    listItems = ("pluginsWithFunctionCall", "inputSuggestions")
+    dictItems = ("aliases", "predefinedContexts", "predefinedInstructions")
+    collectionItems = listItems + dictItems + ("chatGPTTransformers", "chatGPTApiFunctionSignatures", "chatGPTApiAvailableFunctions")
+    # changed when the format of manifest entries is changed
+    manifestVersion = 3
+
+    def __init__(self, execPythonFile, manifestFile, namespace):
+        # execPythonFile runs a plugin in the same scope as LetMeDoItAI.execPythonFile does, i.e. namespace
+        self.execPythonFile = execPythonFile
+        self.namespace = namespace
+        self.manifestFile = manifestFile
+        self.manifest = self.loadManifest()
+        self.manifestUpdated = False
+        # plugins executed in the current process and their functions
+        self.loadedPlugins = set()
+        self.loadedFunctions = {}
+        # plugins in load order and top-level names they bind in namespace
+        self.order = []
+        self.names = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def getFingerprint():
+        # plugins read the following values when they register their features
+        # a cached manifest is discarded if any of them is changed
+        values = (
+            PluginRegistry.manifestVersion,
+            sys.executable,
+            config.letMeDoItAIFolder,
+            config.isTermux,
+            config.terminalEnableTermuxAPI,
+            getattr(config, "open", ""),
+            config.improvedWritingSytle,
+            config.ttsLanguages,
+        )
+        return hashlib.md5(json.dumps(values, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def getFileKey(script):
+        stat = os.stat(script)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def loadManifest(self):
+        fingerprint = self.getFingerprint()
+        try:
+            with open(self.manifestFile, "r", encoding="utf-8") as fileObj:
+                manifest = json.load(fileObj)
+            if manifest.get("fingerprint") == fingerprint and isinstance(manifest.get("plugins"), dict):
+                return manifest
+        except:
+            pass
+        return {"fingerprint": fingerprint, "plugins": {}}
+
+    def saveManifest(self):
+        if not self.manifestUpdated:
+            return None
+        try:
+            with open(self.manifestFile, "w", encoding="utf-8") as fileObj:
+                json.dump(self.manifest, fileObj)
+            self.manifestUpdated = False
+        except:
+            if config.developer:
+                print(f"Failed to save plugin manifest '{self.manifestFile}'!")
+
+    def runPlugin(self, script):
+        try:
+            key = self.getFileKey(script)
+        except:
+            return None
+        if not script in self.order:
+            self.order.append(script)
+        entry = self.manifest["plugins"].get(script)
+        if config.lazyPluginLoading and entry and entry.get("key") == key and not entry.get("eager"):
+            # register plugin features from the manifest; plugin is imported on its first function call
+            self.names[script] = entry["names"]
+            self.registerEntry(script, entry)
+        else:
+            entry = self.recordPlugin(script, key)
+            if entry is not None:
+                self.manifest["plugins"][script] = entry
+                self.manifestUpdated = True
+
+    def takeSnapshot(self):
+        snapshot = {}
+        for item in self.collectionItems:
+            value = getattr(config, item)
+            snapshot[item] = value[:] if isinstance(value, list) else dict(value)
+        return snapshot
+
+    def restoreSnapshot(self, snapshot):
+        for item, value in snapshot.items():
+            if isinstance(value, list):
+                getattr(config, item)[:] = value
+            else:
+                collection = getattr(config, item)
+                collection.clear()
+                collection.update(value)
+
+    def recordPlugin(self, script, key):
+        snapshot = self.takeSnapshot()
+        attributes = {name: getattr(config, name) for name in dir(config) if not name.startswith("__")}
+        # record persistent and temporary configs added via config.setConfig
+        settings = []
+        setConfig = config.setConfig
+        def recordSetConfig(defaultSettings, thisTranslation={}, temporary=False):
+            settings.append([list(defaultSettings), thisTranslation, temporary])
+            setConfig(defaultSettings, thisTranslation, temporary)
+        config.setConfig = recordSetConfig
+        before = dict(self.namespace)
+        try:
+            success = self.execPythonFile(script)
+        finally:
+            config.setConfig = setConfig
+        if not success:
+            return None
+        self.loadedPlugins.add(script)
+        names = self.getBoundNames(before)
+        self.names[script] = names
+
+        def getNewItems(item):
+            before, after = snapshot[item], getattr(config, item)
+            return after[len(before):]
+        def getChangedItems(item):
+            before, after = snapshot[item], getattr(config, item)
+            return {k: v for k, v in after.items() if not k in before or not before[k] is v}
+
+        functions = getChangedItems("chatGPTApiAvailableFunctions")
+        self.loadedFunctions.update(functions)
+        # signatures inserted at the beginning, e.g. integrate_google_searches, are kept in front
+        signatures = config.chatGPTApiFunctionSignatures
+        oldSignatures = [id(i) for i in snapshot["chatGPTApiFunctionSignatures"]]
+        prepended = []
+        for signature in signatures:
+            if id(signature) in oldSignatures:
+                break
+            prepended.append(signature)
+        appended = [i for i in signatures[len(prepended):] if not id(i) in oldSignatures]
+
+        # plugins that set other config attributes are executed on every start, as values may depend on the environment, e.g. installed programs, or may not be cached, e.g. functions
+        settingNames = [key for defaultSettings, *_ in settings for key, _ in defaultSettings]
+        setsAttributes = any(
+            not name in attributes or not attributes[name] is getattr(config, name)
+            for name in dir(config)
+            if not name.startswith("__") and not name in self.collectionItems and not name in settingNames
+        )
+
+        entry = {
+            "key": key,
+            "eager": bool(getNewItems("chatGPTTransformers")) or setsAttributes,
+            "pluginsWithFunctionCall": getNewItems("pluginsWithFunctionCall"),
+            "inputSuggestions": getNewItems("inputSuggestions"),
+            "aliases": getChangedItems("aliases"),
+            "predefinedContexts": getChangedItems("predefinedContexts"),
+            "predefinedInstructions": getChangedItems("predefinedInstructions"),
+            "prependedSignatures": prepended,
+            "functionSignatures": appended,
+            "functions": list(functions.keys()),
+            "settings": settings,
+            "names": names,
+        }
+        try:
+            # validate that the entry can be cached
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            entry = {"key": key, "eager": True, "names": names}
+        return entry
+
+    def getBoundNames(self, before):
+        return [name for name, value in self.namespace.items() if not name in before or not before[name] is value]
+
+    def registerEntry(self, script, entry):
+        for item in self.listItems:
+            getattr(config, item).extend(entry[item])
+        for item in self.dictItems:
+            getattr(config, item).update(entry[item])
+        for signature in reversed(entry["prependedSignatures"]):
+            config.chatGPTApiFunctionSignatures.insert(0, signature)
+        config.chatGPTApiFunctionSignatures.extend(entry["functionSignatures"])
+        for defaultSettings, thisTranslation, temporary in entry["settings"]:
+            config.setConfig(defaultSettings, thisTranslation, temporary)
+        for name in entry["functions"]:
+            if script in self.loadedPlugins and name in self.loadedFunctions:
+                config.chatGPTApiAvailableFunctions[name] = self.loadedFunctions[name]
+            else:
+                config.chatGPTApiAvailableFunctions[name] = self.getLazyFunction(script, name)
+
+    def getLazyFunction(self, script, name):
+        def lazyFunction(function_args):
+            if self.importPlugin(script) and name in self.loadedFunctions:
+                function = self.loadedFunctions[name]
+                if config.chatGPTApiAvailableFunctions.get(name) is lazyFunction:
+                    config.chatGPTApiAvailableFunctions[name] = function
+                return function(function_args)
+            return "[INVALID]"
+        return lazyFunction
+
+    def importPlugin(self, script):
+        with self.lock:
+            if script in self.loadedPlugins:
+                return True
+            # features of the plugin were already registered from the manifest
+            # keep only the functions it defines
+            snapshot = self.takeSnapshot()
+            namespace = dict(self.namespace)
+            success = self.execPythonFile(script)
+            before = snapshot["chatGPTApiAvailableFunctions"]
+            functions = {k: v for k, v in config.chatGPTApiAvailableFunctions.items() if not k in before or not before[k] is v}
+            self.restoreSnapshot(snapshot)
+            # plugins share one namespace, in which a name holds the value bound by the last plugin in load order
+            # names also bound by plugins loaded later in order are restored, e.g. create_image of plugin "modify images" is not replaced by that of plugin "create images"
+            index = self.order.index(script) if script in self.order else len(self.order)
+            laterNames = {name for i in self.order[index + 1:] if i in self.loadedPlugins for name in self.names.get(i, [])}
+            for name in self.getBoundNames(namespace):
+                if name in laterNames and name in namespace:
+                    self.namespace[name] = namespace[name]
+            if success:
+                self.loadedPlugins.add(script)
+                self.loadedFunctions.update(functions)
+            return success
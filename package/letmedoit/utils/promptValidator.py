@@ -1,5 +1,5 @@
 from letmedoit import config
-from letmedoit.utils.shared_utils import SharedUtil
+from letmedoit.utils.token_estimator import TokenEstimator
 from prompt_toolkit.validation import Validator, ValidationError
 from prompt_toolkit.application import run_in_terminal
 #from prompt_toolkit.application import get_app
@@ -11,24 +11,14 @@ except:
 
 
 class TokenValidator(Validator):
+    # token limit is checked when user input is submitted; token count in the toolbar is updated in background, see TokenEstimator
     def validate(self, document):
         #current_buffer = get_app().current_buffer
         currentInput = document.text
         if not config.dynamicTokenCount or not currentInput or currentInput.lower() in (config.exit_entry, config.cancel_entry, ".new", ".share", ".save"):
             pass
         elif tiktokenImported:
-            try:
-                encoding = tiktoken.encoding_for_model(config.chatGPTApiModel)
-            except:
-                encoding = tiktoken.get_encoding("cl100k_base")
-            if "[NO_FUNCTION_CALL]" in currentInput:
-                availableFunctionTokens = 0
-                currentInput = currentInput.replace("[NO_FUNCTION_CALL]", "")
-            else:
-                availableFunctionTokens = SharedUtil.count_tokens_from_functions(config.chatGPTApiFunctionSignatures)
-            currentInputTokens = len(encoding.encode(config.fineTuneUserInput(currentInput)))
-            loadedMessageTokens = SharedUtil.count_tokens_from_messages(config.currentMessages)
-            selectedModelLimit = SharedUtil.tokenLimits[config.chatGPTApiModel]
+            availableFunctionTokens, loadedMessageTokens, currentInputTokens, selectedModelLimit = TokenEstimator.estimate(currentInput)
             #estimatedAvailableTokens = selectedModelLimit - availableFunctionTokens - loadedMessageTokens - currentInputTokens
 
             config.dynamicToolBarText = f" Tokens: {(availableFunctionTokens + loadedMessageTokens + currentInputTokens)}/{selectedModelLimit} [ctrl+k] shortcut keys "
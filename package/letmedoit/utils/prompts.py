@@ -286,7 +286,7 @@ Available tokens: {estimatedAvailableTokens}
         else:
             print(keyHelp)
 
-    def simplePrompt(self, numberOnly=False, validator=None, inputIndicator="", default="", accept_default=False, completer=None, promptSession=None, style=None, is_password=False, bottom_toolbar=None):
+    def simplePrompt(self, numberOnly=False, validator=None, inputIndicator="", default="", accept_default=False, completer=None, promptSession=None, style=None, is_password=False, bottom_toolbar=None, validate_while_typing=True):
         config.selectAll = False
         inputPrompt = promptSession.prompt if promptSession is not None else prompt
         if not inputIndicator:
@@ -301,6 +301,7 @@ Available tokens: {estimatedAvailableTokens}
             swap_light_and_dark_colors=Condition(lambda: not config.terminalResourceLinkColor.startswith("ansibright")),
             style=self.promptStyle1 if style is None else style,
             validator=validator,
+            validate_while_typing=validate_while_typing,
             multiline=Condition(lambda: config.multilineInput),
             default=default,
             accept_default=accept_default,
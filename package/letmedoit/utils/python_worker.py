@@ -0,0 +1,273 @@
+from letmedoit import config
+import multiprocessing, importlib, threading, traceback, builtins, signal, io, os, sys, time
+try:
+    import resource
+except:
+    # not available on Windows
+    resource = None
+
+
+class TeeOutput(io.TextIOBase):
+
+    # write to the terminal and keep a copy of output
+    def __init__(self, stream, echo=True):
+        self.stream = stream
+        self.echo = echo
+        self.buffer = io.StringIO()
+
+    def write(self, text):
+        if self.echo:
+            self.stream.write(text)
+        return self.buffer.write(text)
+
+    def flush(self):
+        if self.echo:
+            self.stream.flush()
+
+    def isatty(self):
+        return self.echo and self.stream.isatty()
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+def runWorker(connection, preloadModules, memoryLimit):
+    # loop of the worker process; variables and imports are kept across requests, like exec(code, globals()) in the main process
+    # ctrl+c pressed in the chat process is handled there, by terminating the worker when it is running code
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memoryLimit > 0:
+        try:
+            limit = memoryLimit * 1024 * 1024
+            # limit data rather than address space, which numpy, openblas or torch reserve far beyond their use
+            resource.setrlimit(getattr(resource, "RLIMIT_DATA", resource.RLIMIT_AS), (limit, limit))
+        except:
+            pass
+    # stdin of the worker is closed; input is read by the chat process
+    def workerInput(prompt=""):
+        sys.stdout.flush()
+        connection.send({"input": str(prompt)})
+        text = connection.recv()
+        if text is None:
+            raise EOFError("input is not available")
+        return text
+    builtins.input = workerInput
+    namespace = {"__name__": "__main__", "config": config}
+    for module in preloadModules:
+        try:
+            importlib.import_module(module)
+            rootModule = module.split(".")[0]
+            namespace[rootModule] = sys.modules[rootModule]
+        except:
+            pass
+    connection.send({"ready": True})
+    while True:
+        try:
+            code, echo, cwd = connection.recv()
+        except EOFError:
+            break
+        if code is None:
+            break
+        # follow the current directory of the chat process
+        try:
+            os.chdir(cwd)
+        except:
+            pass
+        config.pythonFunctionResponse = ""
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = TeeOutput(stdout, echo)
+        sys.stderr = TeeOutput(stderr, echo)
+        trace = ""
+        try:
+            exec(code, namespace)
+        except BaseException:
+            trace = traceback.format_exc()
+        finally:
+            output = sys.stdout.getvalue()
+            sys.stdout.flush()
+            sys.stdout, sys.stderr = stdout, stderr
+        # last expression value of code refined with SharedUtil.fineTunePythonCode
+        value = getattr(config, "pythonFunctionResponse", None)
+        response = str(value) if value is not None and type(value) in (int, float, str, list, tuple, dict, set, bool) else None
+        # the chat process changes to the final directory, in case code changes it
+        connection.send({"stdout": output, "response": response, "trace": trace, "cwd": os.getcwd()})
+
+
+class PythonWorker:
+
+    # a persistent process that runs python code generated by llm, outside the chat process
+    # a spawned process does not inherit threads and locks of the chat process
+    context = multiprocessing.get_context("spawn")
+    # worker shared by python code execution and auto-healing
+    default = None
+    defaultLock = threading.Lock()
+    # set to False when a worker process cannot be started on the device
+    available = True
+
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.ready = False
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def getDefault():
+        with PythonWorker.defaultLock:
+            if PythonWorker.default is None:
+                PythonWorker.default = PythonWorker()
+            return PythonWorker.default
+
+    @staticmethod
+    def warmUp():
+        # start the worker in advance, so that the first python code does not wait for preloaded modules
+        try:
+            worker = PythonWorker.getDefault()
+            with worker.lock:
+                worker.start()
+        except:
+            PythonWorker.available = False
+
+    @staticmethod
+    def run(code, echo=True):
+        return PythonWorker.getDefault().execute(code, echo)
+
+    def isAlive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        # preloaded modules are imported in background, while the chat process continues
+        if self.isAlive():
+            return None
+        parentConnection, childConnection = PythonWorker.context.Pipe()
+        process = PythonWorker.context.Process(
+            target=runWorker,
+            args=(childConnection, list(config.pythonWorkerPreloadModules), config.pythonWorkerMemoryLimit),
+            daemon=True,
+        )
+        process.start()
+        childConnection.close()
+        self.process, self.connection, self.ready = process, parentConnection, False
+
+    def stop(self, terminate=False):
+        # terminate the worker without waiting if it is still running code
+        if self.process is None:
+            return None
+        try:
+            if not terminate and self.process.is_alive():
+                self.connection.send((None, False, None))
+                self.process.join(1)
+        except:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        try:
+            self.connection.close()
+        except:
+            pass
+        self.process, self.connection, self.ready = None, None, False
+
+    def cancel(self):
+        # stop code running in another thread; execute returns once the worker process is terminated
+        self.cancelled = True
+        process = self.process
+        if process is not None and process.is_alive():
+            process.terminate()
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def receive(self, deadline, echo=True):
+        # answer input requests of code until its result is received
+        while True:
+            if deadline is None:
+                message = self.connection.recv()
+            else:
+                timeout = deadline - time.time()
+                if not (timeout > 0 and self.connection.poll(timeout)):
+                    raise TimeoutError
+                message = self.connection.recv()
+            if not "input" in message:
+                return message
+            # time waiting for user input is not counted in the time limit
+            startTime = time.time()
+            try:
+                text = input(message["input"]) if echo else None
+            except EOFError:
+                text = None
+            self.connection.send(text)
+            if deadline is not None:
+                deadline += time.time() - startTime
+
+    def execute(self, code, echo=True):
+        # return a dictionary of stdout, the last expression value, the traceback, which is empty if code is executed successfully, and the final current directory
+        # the worker is restarted when it crashes, exceeds config.pythonWorkerTimeout or is interrupted
+        with self.lock:
+            self.start()
+            if self.cancelled:
+                self.stop(terminate=True)
+                return {"stdout": "", "response": None, "trace": "CancelledError: code execution was cancelled", "cwd": None}
+            deadline = time.time() + config.pythonWorkerTimeout if config.pythonWorkerTimeout > 0 else None
+            try:
+                if not self.ready:
+                    # preloading modules is not counted in the time limit
+                    self.connection.recv()
+                    self.ready = True
+                    if deadline is not None:
+                        deadline = time.time() + config.pythonWorkerTimeout
+                self.connection.send((code, echo, os.getcwd()))
+                return self.receive(deadline, echo)
+            except TimeoutError:
+                self.stop(terminate=True)
+                trace = f"TimeoutError: code execution exceeded the time limit of {config.pythonWorkerTimeout} seconds"
+            except KeyboardInterrupt:
+                self.stop(terminate=True)
+                trace = "KeyboardInterrupt: code execution was interrupted"
+            except (EOFError, OSError):
+                process = self.process
+                self.stop()
+                exitcode = process.exitcode if process is not None else None
+                trace = f"RuntimeError: python worker stopped unexpectedly with exit code {exitcode}"
+                if config.pythonWorkerMemoryLimit > 0:
+                    trace += f"; it may have exceeded the memory limit of {config.pythonWorkerMemoryLimit} MB"
+            return {"stdout": "", "response": None, "trace": trace, "cwd": None}
+
+    @staticmethod
+    def runCandidates(codes):
+        # run codes in parallel, each in an isolated worker, and cancel the others once one of them is executed successfully
+        # return index of the successful code, or -1 if all fail, and results of all codes; results of cancelled codes are None
+        workers = [PythonWorker() for _ in codes]
+        results = [None] * len(codes)
+        winner = []
+        condition = threading.Condition()
+        def run(index):
+            try:
+                result = workers[index].execute(codes[index], echo=False)
+            except:
+                result = {"stdout": "", "response": None, "trace": traceback.format_exc(), "cwd": None}
+            with condition:
+                if winner:
+                    # cancelled
+                    return None
+                results[index] = result
+                if not result["trace"]:
+                    winner.append(index)
+                condition.notify()
+        threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(len(codes))]
+        for thread in threads:
+            thread.start()
+        try:
+            with condition:
+                condition.wait_for(lambda: winner or all(result is not None for result in results))
+        finally:
+            # workers are also terminated when ctrl+c is pressed
+            with condition:
+                winner.append(-1)
+            for worker in workers:
+                worker.cancel()
+            for thread in threads:
+                thread.join(2)
+            for worker in workers:
+                worker.stop(terminate=True)
+        return winner[0], results
@@ -0,0 +1,103 @@
+from letmedoit import config
+import os, json, hashlib, threading, time
+
+
+class ResponseCache:
+
+    # responses of auxiliary llm calls, e.g. risk assessment, stored one json file per request
+    folder = ""
+    # approximate size of cached responses, in bytes; the cache folder is scanned only when it exceeds config.responseCacheMaxSize
+    size = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def getFolder():
+        if not ResponseCache.folder:
+            # import statement is placed here, as SharedUtil imports this module
+            from letmedoit.utils.shared_utils import SharedUtil
+            storageDir = SharedUtil.getStorageDir()
+            folder = os.path.join(storageDir if storageDir else config.letMeDoItAIFolder, "cache", "responses")
+            os.makedirs(folder, exist_ok=True)
+            ResponseCache.folder = folder
+        return ResponseCache.folder
+
+    @staticmethod
+    def getKey(model, temperature, messages, tools=None):
+        messagesHash = hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        toolsHash = hashlib.sha256(json.dumps(tools, sort_keys=True, default=str).encode("utf-8")).hexdigest() if tools else ""
+        return hashlib.sha256(json.dumps([model, temperature, messagesHash, toolsHash]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get(key):
+        try:
+            filePath = os.path.join(ResponseCache.getFolder(), f"{key}.json")
+            with open(filePath, "r", encoding="utf-8") as fileObj:
+                entry = json.load(fileObj)
+            if time.time() - entry["time"] > config.responseCacheTTL:
+                os.remove(filePath)
+                return None
+            # modification time records the last use for eviction
+            os.utime(filePath)
+            return entry["response"]
+        except:
+            return None
+
+    @staticmethod
+    def set(key, response):
+        try:
+            filePath = os.path.join(ResponseCache.getFolder(), f"{key}.json")
+            with ResponseCache.lock:
+                with open(filePath, "w", encoding="utf-8") as fileObj:
+                    json.dump({"time": time.time(), "response": response}, fileObj)
+                if ResponseCache.size is None:
+                    ResponseCache.evict()
+                else:
+                    ResponseCache.size += os.path.getsize(filePath)
+                    if ResponseCache.size > config.responseCacheMaxSize * 1024 * 1024:
+                        ResponseCache.evict()
+        except:
+            if config.developer:
+                print("Failed to cache response!")
+
+    @staticmethod
+    def getResponse(key, getResponse, temperature=0.0):
+        # return a cached response or the result of getResponse, which is cached if it is not empty
+        # only responses generated at temperature 0 are cached, as others are random samples
+        if not config.responseCache or temperature:
+            return getResponse()
+        response = ResponseCache.get(key)
+        if response is None:
+            response = getResponse()
+            if response:
+                ResponseCache.set(key, response)
+        return response
+
+    @staticmethod
+    def evict():
+        # remove expired responses and the least recently used ones when the cache exceeds config.responseCacheMaxSize (in MB)
+        maxSize = config.responseCacheMaxSize * 1024 * 1024
+        expiry = time.time() - config.responseCacheTTL
+        files = []
+        totalSize = 0
+        with os.scandir(ResponseCache.getFolder()) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    if stat.st_mtime < expiry:
+                        try:
+                            os.remove(entry.path)
+                        except:
+                            pass
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    totalSize += stat.st_size
+        if totalSize > maxSize:
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                    totalSize -= size
+                except:
+                    pass
+                if totalSize <= maxSize:
+                    break
+        ResponseCache.size = totalSize
@@ -0,0 +1,160 @@
+import ast, hashlib, threading
+
+
+class RiskClassifier:
+
+    # calls that may damage the device, delete or move files, run other programs or send data over network
+    highRiskCalls = {
+        "os.remove", "os.unlink", "os.rmdir", "os.removedirs", "os.rename", "os.renames", "os.replace",
+        "os.system", "os.popen", "os.kill", "os.killpg", "os.fork", "os.chmod", "os.chown", "os.truncate",
+        "shutil.rmtree", "shutil.move", "shutil.chown",
+        "subprocess.run", "subprocess.call", "subprocess.check_call", "subprocess.check_output", "subprocess.Popen", "subprocess.getoutput", "subprocess.getstatusoutput",
+        "eval", "exec", "compile", "__import__", "importlib.import_module",
+        "requests.post", "requests.put", "requests.patch", "requests.delete",
+        "httpx.post", "httpx.put", "httpx.patch", "httpx.delete",
+        "smtplib.SMTP", "smtplib.SMTP_SSL", "ftplib.FTP", "ftplib.FTP_TLS", "socket.socket", "socket.create_connection",
+        "ctypes.CDLL", "ctypes.WinDLL",
+    }
+    highRiskPrefixes = ("os.exec", "os.spawn", "os.posix_spawn", "pty.", "ctypes.", "numpy.ctypeslib.", "winreg.", "paramiko.")
+    # methods that delete files or stop processes, whatever objects they are called on
+    highRiskMethods = {"unlink", "rmdir", "rmtree", "kill", "terminate", "send_signal", "chmod", "chown", "rename", "replace_file"}
+    # calls that create, modify or map files
+    mediumRiskCalls = {
+        "os.mkdir", "os.makedirs", "os.symlink", "os.link", "shutil.copy", "shutil.copy2", "shutil.copyfile", "shutil.copytree", "shutil.make_archive", "shutil.unpack_archive", "webbrowser.open", "webbrowser.open_new", "webbrowser.open_new_tab",
+        "numpy.save", "numpy.savez", "numpy.savez_compressed", "numpy.savetxt", "numpy.memmap", "numpy.fromfile", "numpy.load", "numpy.loadtxt", "numpy.genfromtxt", "numpy.lib.format.open_memmap",
+    }
+    mediumRiskMethods = {"write", "writelines", "write_text", "write_bytes", "mkdir", "touch", "save", "savefig", "tofile", "to_csv", "to_excel", "to_json", "to_pickle", "to_parquet", "dump", "extractall", "commit", "executescript"}
+    # modules that do not access files, processes or network by themselves
+    safeModules = {
+        "math", "cmath", "datetime", "time", "calendar", "json", "re", "random", "statistics", "string", "textwrap",
+        "itertools", "functools", "operator", "collections", "decimal", "fractions", "numbers", "pprint", "typing",
+        "dataclasses", "enum", "copy", "heapq", "bisect", "array", "uuid", "hashlib", "base64", "unicodedata",
+        "zoneinfo", "pytz", "pendulum", "platform", "getpass", "locale",
+    }
+    safeBuiltins = {
+        "print", "len", "range", "enumerate", "zip", "map", "filter", "sorted", "reversed", "sum", "min", "max", "abs",
+        "round", "pow", "divmod", "int", "float", "complex", "str", "bool", "list", "dict", "set", "frozenset", "tuple",
+        "bytes", "bytearray", "repr", "format", "isinstance", "issubclass", "hasattr", "type", "id", "hash",
+        "chr", "ord", "hex", "oct", "bin", "all", "any", "iter", "next", "slice", "super", "object", "input",
+    }
+
+    # names that give access to any function, e.g. f = getattr(os, "remove")
+    indirectNames = {"eval", "exec", "compile", "__import__", "__builtins__", "getattr", "setattr", "delattr", "globals", "locals", "vars", "breakpoint"}
+
+    # verdicts, keyed by md5 of code
+    verdicts = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def getCodeHash(code):
+        return hashlib.md5(code.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def getVerdict(code):
+        with RiskClassifier.lock:
+            return RiskClassifier.verdicts.get(RiskClassifier.getCodeHash(code))
+
+    @staticmethod
+    def setVerdict(code, risk):
+        with RiskClassifier.lock:
+            RiskClassifier.verdicts[RiskClassifier.getCodeHash(code)] = risk
+
+    @staticmethod
+    def getCallName(node, aliases):
+        # resolve dotted name of a called function, e.g. 'os.remove' for 'from os import remove as rm; rm(path)'
+        names = []
+        while isinstance(node, ast.Attribute):
+            names.insert(0, node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return "", names[-1] if names else ""
+        names.insert(0, aliases.get(node.id, node.id))
+        return ".".join(names), names[-1]
+
+    @staticmethod
+    def isWriteMode(call):
+        mode = call.args[1] if len(call.args) > 1 else next((keyword.value for keyword in call.keywords if keyword.arg == "mode"), None)
+        if mode is None:
+            return False
+        if isinstance(mode, ast.Constant) and isinstance(mode.value, str):
+            return any(i in mode.value for i in "wax+")
+        # mode not known until execution
+        return True
+
+    @staticmethod
+    def classify(code):
+        # return 'high', 'medium' or 'low', or None if code needs to be assessed by llm
+        try:
+            tree = ast.parse(code)
+        except:
+            return None
+        aliases = {}
+        definedNames = set()
+        # names assigned to other names, e.g. rm = os.remove
+        assignments = []
+        ambiguous = False
+        medium = False
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Assign, ast.AnnAssign, ast.NamedExpr)) and isinstance(node.value, (ast.Name, ast.Attribute)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                assignments += [(target.id, node.value) for target in targets if isinstance(target, ast.Name)]
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    aliases[alias.asname if alias.asname else alias.name.split(".")[0]] = alias.name if alias.asname else alias.name.split(".")[0]
+                    if not alias.name.split(".")[0] in RiskClassifier.safeModules:
+                        ambiguous = True
+            elif isinstance(node, ast.ImportFrom):
+                module = node.module if node.module else ""
+                for alias in node.names:
+                    aliases[alias.asname if alias.asname else alias.name] = f"{module}.{alias.name}"
+                if not module.split(".")[0] in RiskClassifier.safeModules:
+                    ambiguous = True
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                definedNames.add(node.name)
+            elif isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Store):
+                    # variables assigned in the code
+                    definedNames.add(node.id)
+                elif node.id in RiskClassifier.indirectNames:
+                    ambiguous = True
+            elif isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+                ambiguous = True
+            elif isinstance(node, ast.arg):
+                definedNames.add(node.arg)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                definedNames.add(node.name)
+        # a name assigned to another name is resolved to it, rather than trusted as defined in the code
+        for target, value in assignments:
+            name, _ = RiskClassifier.getCallName(value, aliases)
+            if name:
+                aliases[target] = name
+                definedNames.discard(target)
+        calledFunctions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Name, ast.Attribute)) and isinstance(node.ctx, ast.Load) and not id(node) in calledFunctions:
+                # risky functions referenced without being called here, e.g. handlers = [os.remove], may be called indirectly
+                name, _ = RiskClassifier.getCallName(node, aliases)
+                if name in RiskClassifier.highRiskCalls or name.startswith(RiskClassifier.highRiskPrefixes):
+                    ambiguous = True
+            if not isinstance(node, ast.Call):
+                continue
+            name, method = RiskClassifier.getCallName(node.func, aliases)
+            if name in RiskClassifier.highRiskCalls or name.startswith(RiskClassifier.highRiskPrefixes) or method in RiskClassifier.highRiskMethods:
+                return "high"
+            if name in RiskClassifier.mediumRiskCalls or method in RiskClassifier.mediumRiskMethods:
+                medium = True
+            elif name == "open" or name.endswith(".open"):
+                if RiskClassifier.isWriteMode(node):
+                    medium = True
+            elif not name:
+                # method calls on literals or on returned values, e.g. "a,b".split(",")
+                pass
+            elif "." in name:
+                root = name.split(".")[0]
+                if not root in RiskClassifier.safeModules and not root in definedNames:
+                    ambiguous = True
+            elif not name in RiskClassifier.safeBuiltins and not name in definedNames:
+                ambiguous = True
+        if medium:
+            return "medium"
+        return None if ambiguous else "low"
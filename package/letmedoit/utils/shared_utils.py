@@ -1,8 +1,8 @@
 from letmedoit import config
 from packaging import version
 from bs4 import BeautifulSoup
-import platform, subprocess, os, pydoc, webbrowser, re, socket, wcwidth, unicodedata, traceback
-import datetime, requests, netifaces, textwrap, json, geocoder, base64, getpass, pendulum, pkg_resources
+import platform, subprocess, os, pydoc, webbrowser, re, traceback, time, ast
+import datetime, requests, textwrap, json, base64, pendulum, pkg_resources
 import pygments
 from pygments.lexers.python import PythonLexer
 from pygments.styles import get_style_by_name
@@ -15,7 +15,14 @@ try:
     tiktokenImported = True
 except:
     tiktokenImported = False
-from openai import OpenAI
+from letmedoit.utils.openai_client import OpenAIClient
+from letmedoit.utils.token_ledger import TokenLedger
+from letmedoit.utils.text_wrapper import TextWrapper
+from letmedoit.utils.response_cache import ResponseCache
+from letmedoit.utils.risk_classifier import RiskClassifier
+from letmedoit.utils.python_worker import PythonWorker
+from letmedoit.utils.install import installmodule
+from letmedoit.utils.device_info import DeviceInfo
 from urllib.parse import quote
 from pathlib import Path
 from PIL import Image
@@ -37,6 +44,10 @@ class SharedUtil:
         "gpt-4-32k": 32768,
     }
 
+    # keys of function signatures that are read by LetMeDoIt AI only and not sent to llm
+    # parallel_safe: the function may run concurrently with other parallel-safe functions returned in the same completion
+    signatureMetadataKeys = ("parallel_safe",)
+
     @staticmethod
     def getPackageInstalledVersion(package):
         try:
@@ -85,8 +96,9 @@ class SharedUtil:
         return current_datetime.strftime("%Y-%m-%d_%H_%M_%S")
 
     @staticmethod
-    def showErrors():
-        trace = traceback.format_exc()
+    def showErrors(trace=""):
+        if not trace:
+            trace = traceback.format_exc()
         print(trace if config.developer else "Error encountered!")
         return trace
 
@@ -215,24 +227,49 @@ class SharedUtil:
         return information
 
     @staticmethod
-    def executePythonCode(code):
+    def runPythonCode(code):
+        # return traceback if an error is encountered, otherwise an empty string
+        if config.pythonWorker and PythonWorker.available:
+            try:
+                result = PythonWorker.run(code)
+                config.pythonFunctionResponse = result["response"]
+                SharedUtil.followWorkerDirectory(result)
+                return result["trace"]
+            except:
+                PythonWorker.available = False
+                if config.developer:
+                    print("Python worker is not available! Python code is executed in the chat process.")
         try:
             exec(code, globals())
-            pythonFunctionResponse = SharedUtil.getPythonFunctionResponse(code)
+            return ""
         except:
-            trace = SharedUtil.showErrors()
+            return traceback.format_exc()
+
+    @staticmethod
+    def followWorkerDirectory(result):
+        # apply changes of current directory made by code in python worker
+        cwd = result.get("cwd")
+        if cwd and not cwd == os.getcwd() and os.path.isdir(cwd):
+            os.chdir(cwd)
+
+    @staticmethod
+    def executePythonCode(code):
+        trace = SharedUtil.runPythonCode(code)
+        if trace:
+            SharedUtil.showErrors(trace)
             config.print(config.divider)
             if config.max_consecutive_auto_heal > 0:
                 return SharedUtil.autoHealPythonCode(code, trace)
             else:
                 return "[INVALID]"
+        pythonFunctionResponse = SharedUtil.getPythonFunctionResponse(code)
         if not pythonFunctionResponse:
             return ""
         return json.dumps({"information": pythonFunctionResponse})
 
     @staticmethod
     def convertFunctionSignaturesIntoTools(functionSignatures):
-        return [{"type": "function", "function": func} for func in functionSignatures]
+        return [{"type": "function", "function": {k: v for k, v in func.items() if not k in SharedUtil.signatureMetadataKeys}} for func in functionSignatures]
 
     @staticmethod
     def getPythonFunctionResponse(code):
@@ -240,10 +277,16 @@ class SharedUtil:
 
     @staticmethod
     def autoHealPythonCode(code, trace):
+        # run several candidate fixes in parallel, see config.autoHealCandidates
+        parallel = config.autoHealCandidates > 1 and config.pythonWorker and PythonWorker.available
+        startTime = time.time()
         for i in range(config.max_consecutive_auto_heal):
             userInput = f"Original python code:\n```\n{code}\n```\n\nTraceback:\n```\n{trace}\n```"
             config.print3(f"Auto-correction attempt: {(i + 1)}")
-            function_call_message, function_call_response = SharedUtil.getSingleFunctionResponse(userInput, config.heal_python_signature, "heal_python")
+            if parallel:
+                function_call_response, fix, winner = SharedUtil.healPythonCodeInParallel(userInput, trace)
+            else:
+                function_call_message, function_call_response = SharedUtil.getSingleFunctionResponse(userInput, config.heal_python_signature, "heal_python")
             # display response
             config.print(config.divider)
             if config.developer:
@@ -251,9 +294,11 @@ class SharedUtil:
             else:
                 config.print("Executed!" if function_call_response == "EXECUTED" else "Failed!")
             if function_call_response == "EXECUTED":
+                if parallel:
+                    config.print3(f"Candidate {winner + 1} of {config.autoHealCandidates} succeeded in attempt {i + 1}, {(time.time() - startTime):.1f} seconds after the error.")
                 break
             else:
-                code = json.loads(function_call_message["function_call"]["arguments"]).get("fix")
+                code = fix if parallel else json.loads(function_call_message["function_call"]["arguments"]).get("fix")
                 trace = function_call_response
             config.print(config.divider)
         # return information if any
@@ -273,6 +318,50 @@ class SharedUtil:
         else:
             return "[INVALID]"
 
+    @staticmethod
+    def healPythonCodeInParallel(userInput, trace):
+        # request config.autoHealCandidates fixes at once and run them in isolated workers, if none of them has side effects
+        # the first successful fix, or the first fix if none succeeds, is then run in the persistent worker
+        # return "EXECUTED", the fix and its index, or traceback, the fix and -1 if it fails
+        try:
+            candidates = SharedUtil.getSingleFunctionCandidates(userInput, config.heal_python_signature, "heal_python", config.autoHealCandidates)
+        except:
+            candidates = []
+        candidates = [candidate for candidate in candidates if candidate.get("fix", "")]
+        if not candidates:
+            return trace, "", -1
+        # install missing packages once, before running candidates
+        missing = []
+        for candidate in candidates:
+            packages = candidate.get("missing", [])
+            if isinstance(packages, str):
+                try:
+                    packages = ast.literal_eval(packages)
+                except:
+                    packages = []
+            missing += [i for i in packages if isinstance(i, str) and not i in missing]
+        if missing:
+            config.print2("Installing missing packages ...")
+            for i in missing:
+                installmodule(f"--upgrade {i}")
+        codes = [SharedUtil.fineTunePythonCode(candidate["fix"]) for candidate in candidates]
+        # candidates that may have side effects, e.g. writing files, would take effect once for each candidate
+        if all(RiskClassifier.classify(code) == "low" for code in codes):
+            config.print2(f"Running {len(candidates)} improved versions of code in parallel ...")
+            index, _ = PythonWorker.runCandidates(codes)
+            if index < 0:
+                index = 0
+        else:
+            index = 0
+        candidate = candidates[index]
+        config.print3(f"""Issue: {candidate.get("issue", "")}""")
+        SharedUtil.displayPythonCode(candidate["fix"])
+        # run the selected fix in the persistent worker, to keep its variables and imports for later code
+        trace = SharedUtil.runPythonCode(codes[index])
+        if trace:
+            return trace, candidate["fix"], -1
+        return "EXECUTED", candidate["fix"], index
+
     @staticmethod
     def fineTunePythonCode(code):
         # dedent
@@ -314,15 +403,8 @@ class SharedUtil:
     @staticmethod
     def count_tokens_from_functions(functionSignatures, model=""):
         count = 0
-        if not model:
-            model = config.chatGPTApiModel
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            print("Warning: model not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
         for i in functionSignatures:
-            count += len(encoding.encode(str(i)))
+            count += TokenLedger.countText(str(i), model)
         return count
 
     # The following method was modified from source:
@@ -333,11 +415,7 @@ class SharedUtil:
             model = config.chatGPTApiModel
 
         """Return the number of tokens used by a list of messages."""
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            print("Warning: model not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
+        encoding = TokenLedger.getEncoding(model)
         if model in {
                 "gpt-3.5-turbo",
                 "gpt-3.5-turbo-0613",
@@ -368,19 +446,25 @@ class SharedUtil:
             )
         num_tokens = 0
         for message in messages:
-            num_tokens += tokens_per_message
-            if not "content" in message or not message.get("content", ""):
-                num_tokens += len(encoding.encode(str(message)))
-            else:
-                for key, value in message.items():
-                    num_tokens += len(encoding.encode(value))
-                    if key == "name":
-                        num_tokens += tokens_per_name
+            # only new or changed messages are encoded
+            num_tokens += TokenLedger.countMessage(message, encoding, tokens_per_message, tokens_per_name)
         num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
         return num_tokens
 
     @staticmethod
     def riskAssessment(code):
+        # verdicts are cached by code
+        risk = RiskClassifier.getVerdict(code)
+        if risk is None:
+            # obvious cases are graded locally; llm is consulted only for ambiguous code
+            risk = RiskClassifier.classify(code) if config.localRiskAssessment else None
+            if risk is None:
+                risk = SharedUtil.assessRiskWithLLM(code)
+            RiskClassifier.setVerdict(code, risk)
+        return risk
+
+    @staticmethod
+    def assessRiskWithLLM(code):
         content = f"""You are a senior python engineer.
 Assess the risk level of damaging my device upon executing the python code that I will provide for you.
 Answer me either 'high', 'medium' or 'low', without giving me any extra information.
@@ -390,7 +474,7 @@ Acess the risk level of this Python code:
 {code}
 ```"""
         try:
-            answer = SharedUtil.getSingleChatResponse(content, temperature=0.0)
+            answer = SharedUtil.getSingleChatResponse(content, temperature=0.0, useCache=True)
             if not answer:
                 answer = "high"
             answer = re.sub("[^A-Za-z]", "", answer).lower()
@@ -401,29 +485,63 @@ Acess the risk level of this Python code:
             return "high"
 
     @staticmethod
-    def getSingleFunctionResponse(userInput, functionSignatures, function_name, temperature=None):
+    def getSingleFunctionResponse(userInput, functionSignatures, function_name, temperature=None, useCache=False):
         messages=[{"role": "user", "content" : userInput}]
-        return config.getFunctionMessageAndResponse(messages, functionSignatures, function_name, temperature=temperature)
-
-    @staticmethod
-    def getSingleChatResponse(userInput, temperature=None):
-        try:
-            completion = OpenAI().chat.completions.create(
-                model=config.chatGPTApiModel,
-                messages=[{"role": "user", "content" : userInput}],
-                n=1,
-                temperature=temperature if temperature is not None else config.llmTemperature,
-                max_tokens=config.chatGPTApiMaxTokens,
-            )
-            return completion.choices[0].message.content
-        except:
-            return ""
+        return config.getFunctionMessageAndResponse(messages, functionSignatures, function_name, temperature=temperature, useCache=useCache)
+
+    @staticmethod
+    def getSingleFunctionCandidates(userInput, functionSignatures, function_name, n, temperature=None):
+        # return arguments of n calls of a function, generated in one request
+        messages = [{"role": "user", "content" : userInput}]
+        temperature = temperature if temperature is not None else config.llmTemperature
+        completion = OpenAIClient.getClient().chat.completions.create(
+            model=config.chatGPTApiModel,
+            messages=messages,
+            max_tokens=SharedUtil.getDynamicTokens(messages, functionSignatures),
+            temperature=temperature,
+            n=n,
+            tools=SharedUtil.convertFunctionSignaturesIntoTools(functionSignatures),
+            tool_choice={"type": "function", "function": {"name": function_name}},
+        )
+        candidates = []
+        for choice in completion.choices:
+            try:
+                candidates.append(json.loads(choice.message.tool_calls[0].function.arguments))
+            except:
+                pass
+        return candidates
+
+    @staticmethod
+    def getSingleChatResponse(userInput, temperature=None, useCache=False):
+        # useCache: reuse responses to the same input at temperature 0, see config.responseCache
+        messages = [{"role": "user", "content" : userInput}]
+        temperature = temperature if temperature is not None else config.llmTemperature
+        def getResponse():
+            try:
+                completion = OpenAIClient.getClient().chat.completions.create(
+                    model=config.chatGPTApiModel,
+                    messages=messages,
+                    n=1,
+                    temperature=temperature,
+                    max_tokens=config.chatGPTApiMaxTokens,
+                )
+                return completion.choices[0].message.content
+            except:
+                return ""
+        if useCache:
+            return ResponseCache.getResponse(ResponseCache.getKey(config.chatGPTApiModel, temperature, messages), getResponse, temperature)
+        return getResponse()
 
     # streaming
     @staticmethod
     def getToolArgumentsFromStreams(completion):
         toolArguments = {}
         for event in completion:
+            if not event.choices:
+                # the last event carries token usage only, see config.stablePromptPrefix
+                if getattr(event, "usage", None):
+                    TokenLedger.recordUsage(event.usage)
+                continue
             delta = event.choices[0].delta
             if delta and delta.tool_calls:
                 for tool_call in delta.tool_calls:
@@ -439,23 +557,11 @@ Acess the risk level of this Python code:
 
     @staticmethod
     def get_wan_ip():
-        try:
-            response = requests.get('https://api.ipify.org?format=json', timeout=5)
-            data = response.json()
-            return data['ip']
-        except:
-            return ""
+        return DeviceInfo.getWanIp()
 
     @staticmethod
     def get_local_ip():
-        interfaces = netifaces.interfaces()
-        for interface in interfaces:
-            addresses = netifaces.ifaddresses(interface)
-            if netifaces.AF_INET in addresses:
-                for address in addresses[netifaces.AF_INET]:
-                    ip = address['addr']
-                    if ip != '127.0.0.1':
-                        return ip
+        return DeviceInfo.getLocalIp()
 
     @staticmethod
     def getDayOfWeek():
@@ -466,8 +572,10 @@ Acess the risk level of this Python code:
             return now.format('dddd')
 
     @staticmethod
-    def getDeviceInfo(includeIp=False):
-        g = geocoder.ip('me')
+    def getDeviceInfo(includeIp=False, includeCurrentState=True):
+        # location and ip addresses are cached and refreshed in background, see config.deviceInfoTTL
+        location = DeviceInfo.getLocation(wait=True)
+        staticInfo = DeviceInfo.getStaticInfo()
         if hasattr(config, "thisPlatform"):
             thisPlatform = config.thisPlatform
         else:
@@ -475,48 +583,46 @@ Acess the risk level of this Python code:
             if thisPlatform == "Darwin":
                 thisPlatform = "macOS"
         if config.includeIpInSystemMessageTemp or includeIp or (config.includeIpInSystemMessage and config.includeIpInSystemMessageTemp):
-            wan_ip = SharedUtil.get_wan_ip()
-            local_ip = SharedUtil.get_local_ip()
-            ipInfo = f'''Wan ip: {wan_ip}
-Local ip: {local_ip}
+            ipInfo = DeviceInfo.getIpInfo(wait=True)
+            ipInfo = f'''Wan ip: {ipInfo["wan"]}
+Local ip: {ipInfo["local"]}
 '''
         else:
             ipInfo = ""
+        # current directory and time are left out for a stable system message, see config.stablePromptPrefix
+        currentState = f"{SharedUtil.getCurrentState()}\n" if includeCurrentState else ""
+        return f"""Operating system: {thisPlatform}
+Version: {staticInfo["version"]}
+Machine: {staticInfo["machine"]}
+Architecture: {staticInfo["architecture"]}
+Processor: {staticInfo["processor"]}
+Hostname: {staticInfo["hostname"]}
+Username: {staticInfo["username"]}
+Python version: {staticInfo["python_version"]}
+Python implementation: {staticInfo["python_implementation"]}
+{currentState}{ipInfo}Latitude & longitude: {location["latlng"]}
+Country: {location["country"]}
+State: {location["state"]}
+City: {location["city"]}"""
+
+    @staticmethod
+    def getCurrentState():
         if config.isTermux:
             dayOfWeek = ""
         else:
             dayOfWeek = SharedUtil.getDayOfWeek()
             dayOfWeek = f"Current day of the week: {dayOfWeek}"
-        return f"""Operating system: {thisPlatform}
-Version: {platform.version()}
-Machine: {platform.machine()}
-Architecture: {platform.architecture()[0]}
-Processor: {platform.processor()}
-Hostname: {socket.gethostname()}
-Username: {getpass.getuser()}
-Python version: {platform.python_version()}
-Python implementation: {platform.python_implementation()}
-Current directory: {os.getcwd()}
+        return f"""Current directory: {os.getcwd()}
 Current time: {str(datetime.datetime.now())}
-{dayOfWeek}
-{ipInfo}Latitude & longitude: {g.latlng}
-Country: {g.country}
-State: {g.state}
-City: {g.city}"""
+{dayOfWeek}"""
 
     @staticmethod
     def getStringWidth(text):
-        width = 0
-        for character in text:
-            width += wcwidth.wcwidth(character)
-        return width
+        return TextWrapper.getStringWidth(text)
 
     @staticmethod
     def is_CJK(text):
-        for char in text:
-            if 'CJK' in unicodedata.name(char):
-                return True
-        return False
+        return TextWrapper.isCJK(text)
 
     @staticmethod
     def isPackageInstalled(package):
@@ -1,6 +1,8 @@
 from letmedoit import config
 from letmedoit.health_check import HealthCheck
 from letmedoit.utils.tts_utils import TTSUtil
+from letmedoit.utils.text_wrapper import TextWrapper
+from letmedoit.utils.token_ledger import TokenLedger
 if not hasattr(config, "exit_entry"):
     HealthCheck.setBasicConfig()
     HealthCheck.saveConfig()
@@ -12,58 +14,96 @@ HealthCheck.setPrint()
 #from prompt_toolkit import print_formatted_text
 from prompt_toolkit.keys import Keys
 from prompt_toolkit.input import create_input
-import asyncio, shutil, textwrap, string
+import asyncio, shutil, string, sys, threading, time
 
 
 class StreamingWordWrapper:
 
+    # characters after which streamed text can be transformed without breaking a word or phrase
+    transformBoundaries = (" ", "\n", ".", ",", "!", "?", ";", ":", "。", "，", "、", "！", "？", "；", "：")
+    maxTransformBufferSize = 200
+    # punctuation marks among the boundaries, after which a transformed segment is read by tts
+    punctuationBoundaries = transformBoundaries[2:]
+
     def __init__(self):
         self.streaming_finished = False
         config.tempChunk = ""
+        # streamed output is written to terminal at a limited frame rate, see config.streamingFrameRate
+        self.outputBuffer = []
+        self.lastFlush = 0
+        # buffered output is written by a timer when no further text arrives within a frame
+        self.flushTimer = None
+        self.outputLock = threading.Lock()
+        # streamed text waiting for a word or sentence boundary before being transformed, see config.chatGPTTransformers
+        self.transformBuffer = []
+        self.transformBufferSize = 0
+        self.usageReport = ""
+
+    def write(self, content):
+        frameRate = getattr(config, "streamingFrameRate", 0)
+        with self.outputLock:
+            self.outputBuffer.append(content)
+            delay = (self.lastFlush + 1 / frameRate - time.perf_counter()) if frameRate > 0 else 0
+            if not ("\n" in content or delay <= 0):
+                if self.flushTimer is None:
+                    self.flushTimer = threading.Timer(delay, self.flush)
+                    self.flushTimer.daemon = True
+                    self.flushTimer.start()
+                return None
+        self.flush()
+
+    def flush(self):
+        with self.outputLock:
+            if self.flushTimer is not None:
+                self.flushTimer.cancel()
+                self.flushTimer = None
+            if self.outputBuffer:
+                sys.stdout.write("".join(self.outputBuffer))
+                sys.stdout.flush()
+                self.outputBuffer = []
+            self.lastFlush = time.perf_counter()
 
     @staticmethod
     def wrapText(content, terminal_width=None):
-        if terminal_width is None:
-            terminal_width = shutil.get_terminal_size().columns
-        return "\n".join([textwrap.fill(line, width=terminal_width) for line in content.split("\n")])
+        return TextWrapper.wrapText(content, terminal_width)
 
     def wrapStreamWords(self, answer, terminal_width):
         if " " in answer:
             if answer == " ":
                 if self.lineWidth < terminal_width:
-                    print(" ", end='', flush=True)
+                    self.write(" ")
                     self.lineWidth += 1
             else:
                 answers = answer.split(" ")
                 for index, item in enumerate(answers):
                     isLastItem = (len(answers) - index == 1)
-                    itemWidth = HealthCheck.getStringWidth(item)
+                    itemWidth = TextWrapper.getStringWidth(item)
                     newLineWidth = (self.lineWidth + itemWidth) if isLastItem else (self.lineWidth + itemWidth + 1)
                     if isLastItem:
                         if newLineWidth > terminal_width:
-                            print(f"\n{item}", end='', flush=True)
+                            self.write(f"\n{item}")
                             self.lineWidth = itemWidth
                         else:
-                            print(item, end='', flush=True)
+                            self.write(item)
                             self.lineWidth += itemWidth
                     else:
                         if (newLineWidth - terminal_width) == 1:
-                            print(f"{item}\n", end='', flush=True)
+                            self.write(f"{item}\n")
                             self.lineWidth = 0
                         elif newLineWidth > terminal_width:
-                            print(f"\n{item} ", end='', flush=True)
+                            self.write(f"\n{item} ")
                             self.lineWidth = itemWidth + 1
                         else:
-                            print(f"{item} ", end='', flush=True)
+                            self.write(f"{item} ")
                             self.lineWidth += (itemWidth + 1)
         else:
-            answerWidth = HealthCheck.getStringWidth(answer)
+            answerWidth = TextWrapper.getStringWidth(answer)
             newLineWidth = self.lineWidth + answerWidth
             if newLineWidth > terminal_width:
-                print(f"\n{answer}", end='', flush=True)
+                self.write(f"\n{answer}")
                 self.lineWidth = answerWidth
             else:
-                print(answer, end='', flush=True)
+                self.write(answer)
                 self.lineWidth += answerWidth
 
     def keyToStopStreaming(self, streaming_event):
@@ -96,6 +136,7 @@ class StreamingWordWrapper:
             config.wrapWords = wrapWords
             # reset config.tempChunk
             config.tempChunk = ""
+            self.flush()
             print("\n")
             # add chat response to messages
             if hasattr(config, "currentMessages") and chat_response:
@@ -106,70 +147,126 @@ class StreamingWordWrapper:
                 #self.addPagerContent = False
                 if config.pagerView:
                     config.launchPager(config.pagerContent)
+            # report provider prompt cache usage
+            if self.usageReport and config.developer:
+                print(self.usageReport)
             # finishing
             if hasattr(config, "conversationStarted"):
                 config.conversationStarted = True
             self.streaming_finished = True
 
-        chat_response = ""
+        # chat response is joined once streaming is finished
+        chat_response = []
         self.lineWidth = 0
         blockStart = False
         wrapWords = config.wrapWords
         firstEvent = True
+        # transformers are applied to complete words or sentences rather than to single streamed chunks
+        transformers = config.chatGPTTransformers if hasattr(config, "chatGPTTransformers") else []
+        self.transformBuffer = []
+        self.transformBufferSize = 0
+
+        def displayAnswer(answer):
+            nonlocal blockStart, firstEvent
+            if firstEvent:
+                answer = answer.lstrip()
+                if not answer:
+                    return None
+                firstEvent = False
+            # display the chunk
+            chat_response.append(answer)
+            # word wrap
+            if answer in ("```", "``"):
+                blockStart = not blockStart
+                if blockStart:
+                    config.wrapWords = False
+                else:
+                    config.wrapWords = wrapWords
+            if config.wrapWords:
+                if "\n" in answer:
+                    lines = answer.split("\n")
+                    for index, line in enumerate(lines):
+                        isLastLine = (len(lines) - index == 1)
+                        self.wrapStreamWords(line, terminal_width)
+                        if not isLastLine:
+                            self.write("\n")
+                            self.lineWidth = 0
+                else:
+                    self.wrapStreamWords(answer, terminal_width)
+            else:
+                self.write(answer) # Print the response
+            # speak streaming words
+            self.readAnswer(answer, bool(transformers))
+
+        def displayRemainingAnswer():
+            if self.transformBuffer:
+                displayAnswer(self.releaseTransformBuffer(transformers))
+
         for event in completion:
             if not streaming_event.is_set() and not self.streaming_finished:
                 # RETRIEVE THE TEXT FROM THE RESPONSE
+                if openai and not event.choices:
+                    # the last event carries token usage only, see config.stablePromptPrefix
+                    if getattr(event, "usage", None):
+                        self.usageReport = TokenLedger.recordUsage(event.usage)
+                    continue
                 # openai or vertex
                 answer = event.choices[0].delta.content if openai else event.text
-                # transform
-                if hasattr(config, "chatGPTTransformers"):
-                    for transformer in config.chatGPTTransformers:
-                        answer = transformer(answer)
                 # STREAM THE ANSWER
-                if answer is not None:
-                    if firstEvent:
-                        firstEvent = False
-                        answer = answer.lstrip()
-                    # display the chunk
-                    chat_response += answer
-                    # word wrap
-                    if answer in ("```", "``"):
-                        blockStart = not blockStart
-                        if blockStart:
-                            config.wrapWords = False
-                        else:
-                            config.wrapWords = wrapWords
-                    if config.wrapWords:
-                        if "\n" in answer:
-                            lines = answer.split("\n")
-                            for index, line in enumerate(lines):
-                                isLastLine = (len(lines) - index == 1)
-                                self.wrapStreamWords(line, terminal_width)
-                                if not isLastLine:
-                                    print("\n", end='', flush=True)
-                                    self.lineWidth = 0
-                        else:
-                            self.wrapStreamWords(answer, terminal_width)
-                    else:
-                        print(answer, end='', flush=True) # Print the response
-                    # speak streaming words
-                    self.readAnswer(answer)
+                if answer:
+                    for segment in (self.transformAnswer(answer, transformers) if transformers else (answer,)):
+                        displayAnswer(segment)
             else:
-                finishOutputs(wrapWords, chat_response)
+                displayRemainingAnswer()
+                # discard speech not yet played when streaming is stopped by users
+                if streaming_event.is_set():
+                    TTSUtil.stopBackgroundPlay()
+                finishOutputs(wrapWords, "".join(chat_response))
                 return None
-        
-        finishOutputs(wrapWords, chat_response)
 
-    def readAnswer(self, answer):
+        displayRemainingAnswer()
+        finishOutputs(wrapWords, "".join(chat_response))
+
+    def transformAnswer(self, answer, transformers):
+        # return transformed segments that are ready to display
+        # code block markers are kept as separate segments for toggling word wrap
+        if answer in ("```", "``"):
+            segments = [self.releaseTransformBuffer(transformers)] if self.transformBuffer else []
+            segments.append(answer)
+            return segments
+        boundary = max(answer.rfind(i) for i in self.transformBoundaries)
+        if boundary < 0:
+            self.transformBuffer.append(answer)
+            self.transformBufferSize += len(answer)
+            if self.transformBufferSize < self.maxTransformBufferSize:
+                return []
+            return [self.releaseTransformBuffer(transformers)]
+        self.transformBuffer.append(answer[:boundary + 1])
+        segments = [self.releaseTransformBuffer(transformers)]
+        if boundary + 1 < len(answer):
+            self.transformBuffer.append(answer[boundary + 1:])
+            self.transformBufferSize = len(answer) - boundary - 1
+        return segments
+
+    def releaseTransformBuffer(self, transformers):
+        text = "".join(self.transformBuffer)
+        self.transformBuffer = []
+        self.transformBufferSize = 0
+        for transformer in transformers:
+            text = transformer(text)
+        return text
+
+    def readAnswer(self, answer, transformed=False):
         # read the chunk when there is a punctuation
-        if answer in string.punctuation and config.tempChunk:
+        # a transformed segment, see config.chatGPTTransformers, may end with a punctuation after several words
+        if (answer in string.punctuation and config.tempChunk) or (transformed and answer and answer[-1] in self.punctuationBoundaries):
             # read words when there a punctuation
             chunk = config.tempChunk + answer
             # reset config.tempChunk
             config.tempChunk = ""
-            # play with tts
+            # queue the chunk for tts; speech is synthesized and played in background
             if config.ttsOutput:
-                TTSUtil.play(chunk)
+                TTSUtil.playInBackground(chunk)
         else:
             # append to a chunk for reading
             config.tempChunk += answer
\ No newline at end of file
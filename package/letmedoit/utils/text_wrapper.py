@@ -0,0 +1,124 @@
+import re, bisect, shutil, wcwidth
+
+
+class TextWrapper:
+
+    # code point ranges of CJK characters, which can be wrapped between any two characters
+    cjkRanges = (
+        (0x2E80, 0x2EFF), # CJK Radicals Supplement
+        (0x3000, 0x303F), # CJK Symbols and Punctuation
+        (0x3040, 0x30FF), # Hiragana, Katakana
+        (0x31C0, 0x31EF), # CJK Strokes
+        (0x3300, 0x33FF), # CJK Compatibility
+        (0x3400, 0x4DBF), # CJK Unified Ideographs Extension A
+        (0x4E00, 0x9FFF), # CJK Unified Ideographs
+        (0xF900, 0xFAFF), # CJK Compatibility Ideographs
+        (0xFE30, 0xFE4F), # CJK Compatibility Forms
+        (0xFF00, 0xFFEF), # Halfwidth and Fullwidth Forms
+        (0x20000, 0x2FA1F), # CJK Unified Ideographs Extension B - F, CJK Compatibility Ideographs Supplement
+        (0x30000, 0x323AF), # CJK Unified Ideographs Extension G - H
+    )
+    cjkRangeStarts = [start for start, _ in cjkRanges]
+    # display widths of characters read so far
+    widths = {}
+
+    @staticmethod
+    def isCJKCharacter(char):
+        codepoint = ord(char)
+        index = bisect.bisect_right(TextWrapper.cjkRangeStarts, codepoint) - 1
+        return index >= 0 and codepoint <= TextWrapper.cjkRanges[index][1]
+
+    @staticmethod
+    def isCJK(text):
+        if text.isascii():
+            return False
+        return any(TextWrapper.isCJKCharacter(char) for char in text)
+
+    @staticmethod
+    def getCharWidth(char):
+        width = TextWrapper.widths.get(char)
+        if width is None:
+            # control characters take no space
+            width = max(wcwidth.wcwidth(char), 0)
+            TextWrapper.widths[char] = width
+        return width
+
+    @staticmethod
+    def getStringWidth(text):
+        if text.isascii() and text.isprintable():
+            return len(text)
+        widths = TextWrapper.widths
+        width = 0
+        for char in text:
+            charWidth = widths.get(char)
+            width += TextWrapper.getCharWidth(char) if charWidth is None else charWidth
+        return width
+
+    @staticmethod
+    def wrapText(content, terminal_width=None, html=False):
+        # wrap text at spaces and between CJK characters; words longer than terminal width, e.g. urls and paths, are broken between characters
+        # html/xml tags, if html is True, are kept and take no space; otherwise, tabs are expanded
+        if terminal_width is None:
+            terminal_width = shutil.get_terminal_size().columns
+        output = []
+        lineWidth = 0
+
+        def addWords(words):
+            nonlocal lineWidth
+            words = words.split(" ")
+            lastIndex = len(words) - 1
+            for index, item in enumerate(words):
+                isLastItem = (index == lastIndex)
+                if TextWrapper.isCJK(item) or TextWrapper.getStringWidth(item) > terminal_width:
+                    lastCharIndex = len(item) - 1
+                    for iIndex, i in enumerate(item):
+                        isSpaceItem = (not isLastItem and iIndex == lastCharIndex)
+                        iWidth = TextWrapper.getCharWidth(i)
+                        newLineWidth = lineWidth + iWidth + 1 if isSpaceItem else lineWidth + iWidth
+                        if newLineWidth > terminal_width:
+                            output.append(f"\n{i} " if isSpaceItem else f"\n{i}")
+                            lineWidth = iWidth + 1 if isSpaceItem else iWidth
+                        else:
+                            output.append(f"{i} " if isSpaceItem else i)
+                            lineWidth += iWidth + 1 if isSpaceItem else iWidth
+                else:
+                    itemWidth = TextWrapper.getStringWidth(item)
+                    newLineWidth = lineWidth + itemWidth if isLastItem else lineWidth + itemWidth + 1
+                    if newLineWidth > terminal_width:
+                        output.append(f"\n{item}" if isLastItem else f"\n{item} ")
+                        lineWidth = itemWidth if isLastItem else itemWidth + 1
+                    else:
+                        output.append(item if isLastItem else f"{item} ")
+                        lineWidth += itemWidth if isLastItem else itemWidth + 1
+
+        def processLine(lineText):
+            if html and "<" in lineText and re.search("<[^<>]+?>", lineText):
+                # handle html/xml tags
+                chunks = lineText.split(">")
+                lastIndex = len(chunks) - 1
+                for index, chunk in enumerate(chunks):
+                    if index == lastIndex:
+                        addWords(chunk)
+                    elif "<" in chunk:
+                        nonTag, tagContent = chunk.rsplit("<", 1)
+                        addWords(nonTag)
+                        output.append(f"<{tagContent}>")
+                    else:
+                        addWords(f"{chunk}>")
+            else:
+                addWords(lineText)
+
+        lines = content.split("\n")
+        lastIndex = len(lines) - 1
+        for index, line in enumerate(lines):
+            processLine(line if html else line.expandtabs())
+            if not index == lastIndex:
+                output.append("\n")
+                lineWidth = 0
+        return "".join(output)
+
+    @staticmethod
+    def wrapHTMLText(text, terminal_width=None):
+        if not " " in text:
+            return text
+        return TextWrapper.wrapText(text, terminal_width, html=True)
@@ -0,0 +1,97 @@
+from letmedoit import config
+from letmedoit.utils.shared_utils import SharedUtil
+from letmedoit.utils.token_ledger import TokenLedger
+from letmedoit.utils.context_compactor import ContextCompactor
+import threading, time
+
+
+class TokenEstimator:
+
+    # seconds to wait after the last edit before counting tokens of user input
+    debounceDelay = 0.3
+    condition = threading.Condition()
+    thread = None
+    # input waiting to be counted and the time of its last edit
+    pendingInput = None
+    pendingTime = 0
+    # input last requested, and the prompt application to be refreshed with the estimate
+    lastInput = None
+    app = None
+    # incremented when a new prompt starts; estimates of earlier prompts are discarded
+    generation = 0
+    # token counts of functions and loaded messages, which do not change while user is typing
+    partialSums = {}
+
+    @staticmethod
+    def reset():
+        with TokenEstimator.condition:
+            TokenEstimator.generation += 1
+            TokenEstimator.pendingInput = None
+            TokenEstimator.lastInput = None
+            TokenEstimator.partialSums = {}
+
+    @staticmethod
+    def request(currentInput, app=None):
+        # count tokens in background once user stops typing for debounceDelay seconds; app is refreshed with the new toolbar text
+        with TokenEstimator.condition:
+            if currentInput == TokenEstimator.lastInput:
+                return None
+            TokenEstimator.lastInput = currentInput
+            TokenEstimator.pendingInput = currentInput
+            TokenEstimator.pendingTime = time.time()
+            TokenEstimator.app = app
+            if TokenEstimator.thread is None or not TokenEstimator.thread.is_alive():
+                TokenEstimator.thread = threading.Thread(target=TokenEstimator.run, daemon=True)
+                TokenEstimator.thread.start()
+            TokenEstimator.condition.notify()
+
+    @staticmethod
+    def run():
+        while True:
+            with TokenEstimator.condition:
+                while TokenEstimator.pendingInput is None:
+                    TokenEstimator.condition.wait()
+                delay = TokenEstimator.pendingTime + TokenEstimator.debounceDelay - time.time()
+                if delay > 0:
+                    # wait for further edits
+                    TokenEstimator.condition.wait(delay)
+                    continue
+                currentInput, app, generation = TokenEstimator.pendingInput, TokenEstimator.app, TokenEstimator.generation
+                TokenEstimator.pendingInput = None
+            try:
+                functionTokens, messageTokens, inputTokens, selectedModelLimit = TokenEstimator.estimate(currentInput)
+            except:
+                continue
+            with TokenEstimator.condition:
+                if not generation == TokenEstimator.generation:
+                    continue
+                config.dynamicToolBarText = f" Tokens: {(functionTokens + messageTokens + inputTokens)}/{selectedModelLimit} [ctrl+k] shortcut keys "
+            if app is not None:
+                app.invalidate()
+
+    @staticmethod
+    def getPartialSum(key, count):
+        value = TokenEstimator.partialSums.get(key)
+        if value is None:
+            value = count()
+            TokenEstimator.partialSums[key] = value
+        return value
+
+    @staticmethod
+    def estimate(currentInput):
+        # return numbers of tokens of active functions, loaded messages and current input, and token limit of the selected model
+        model = config.chatGPTApiModel
+        if "[NO_FUNCTION_CALL]" in currentInput:
+            functionTokens = 0
+            currentInput = currentInput.replace("[NO_FUNCTION_CALL]", "")
+        else:
+            functionSignatures = config.chatGPTApiFunctionSignatures
+            functionTokens = TokenEstimator.getPartialSum(("functions", model, id(functionSignatures), len(functionSignatures)), lambda: SharedUtil.count_tokens_from_functions(functionSignatures))
+        messages = config.currentMessages
+        messageTokens = TokenEstimator.getPartialSum(("messages", model, id(messages), len(messages)), lambda: SharedUtil.count_tokens_from_messages(messages))
+        inputTokens = TokenLedger.countText(config.fineTuneUserInput(currentInput), model)
+        selectedModelLimit = SharedUtil.tokenLimits[model]
+        if config.contextCompaction:
+            # earlier messages are compacted before they are sent
+            messageTokens = min(messageTokens, max(ContextCompactor.getBudget() - functionTokens, 0))
+        return functionTokens, messageTokens, inputTokens, selectedModelLimit
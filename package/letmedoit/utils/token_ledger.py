@@ -0,0 +1,91 @@
+from letmedoit import config
+from collections import OrderedDict
+import hashlib, threading
+try:
+    import tiktoken
+    tiktokenImported = True
+except:
+    tiktokenImported = False
+
+
+class TokenLedger:
+
+    # maximum number of cached token counts
+    maxEntries = 4096
+    # resolved encoders, keyed by model
+    encodings = {}
+    # token counts, keyed by encoder name and sha1 digest of content, so that cached entries do not keep content in memory
+    entries = OrderedDict()
+    lock = threading.Lock()
+    # prompt tokens reported by api in the current session, and those read from provider prompt cache
+    promptTokens = 0
+    cachedPromptTokens = 0
+
+    @staticmethod
+    def getEncoding(model=""):
+        if not model:
+            model = config.chatGPTApiModel
+        encoding = TokenLedger.encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                print("Warning: model not found. Using cl100k_base encoding.")
+                encoding = tiktoken.get_encoding("cl100k_base")
+            TokenLedger.encodings[model] = encoding
+        return encoding
+
+    @staticmethod
+    def getCount(key, count):
+        with TokenLedger.lock:
+            if key in TokenLedger.entries:
+                TokenLedger.entries.move_to_end(key)
+                return TokenLedger.entries[key]
+        value = count()
+        with TokenLedger.lock:
+            TokenLedger.entries[key] = value
+            if len(TokenLedger.entries) > TokenLedger.maxEntries:
+                TokenLedger.entries.popitem(last=False)
+        return value
+
+    @staticmethod
+    def getDigest(text):
+        return hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).digest()
+
+    @staticmethod
+    def countText(text, model=""):
+        encoding = TokenLedger.getEncoding(model)
+        return TokenLedger.getCount((encoding.name, TokenLedger.getDigest(text)), lambda: len(encoding.encode(text)))
+
+    @staticmethod
+    def countMessage(message, encoding, tokens_per_message, tokens_per_name):
+        content = message.get("content", "")
+        # other items, e.g. function_call, are counted when content is empty
+        digest = TokenLedger.getDigest(content if content and isinstance(content, str) else str(message))
+        def count():
+            num_tokens = tokens_per_message
+            if not "content" in message or not message.get("content", ""):
+                num_tokens += len(encoding.encode(str(message)))
+            else:
+                for key, value in message.items():
+                    num_tokens += len(encoding.encode(value))
+                    if key == "name":
+                        num_tokens += tokens_per_name
+            return num_tokens
+        return TokenLedger.getCount((encoding.name, tokens_per_message, tokens_per_name, message.get("role"), message.get("name"), digest), count)
+
+    @staticmethod
+    def recordUsage(usage):
+        # return a report of cached prompt tokens
+        promptTokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            cachedTokens = details.get("cached_tokens", 0) or 0
+        else:
+            cachedTokens = getattr(details, "cached_tokens", 0) or 0
+        with TokenLedger.lock:
+            TokenLedger.promptTokens += promptTokens
+            TokenLedger.cachedPromptTokens += cachedTokens
+            sessionRate = TokenLedger.cachedPromptTokens / TokenLedger.promptTokens if TokenLedger.promptTokens else 0
+        rate = cachedTokens / promptTokens if promptTokens else 0
+        return f"Cached prompt tokens: {cachedTokens}/{promptTokens} ({rate:.0%}); session: {TokenLedger.cachedPromptTokens}/{TokenLedger.promptTokens} ({sessionRate:.0%})"
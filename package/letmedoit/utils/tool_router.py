@@ -0,0 +1,59 @@
+from letmedoit import config
+from letmedoit.utils.embedding_service import EmbeddingService
+import numpy, threading
+
+
+class ToolRouter:
+
+    # normalised embeddings of function signatures, keyed by embedding model, function name and description
+    embeddings = {}
+    lock = threading.Lock()
+    # set to False when embeddings are not available, e.g. on Android
+    available = True
+
+    @staticmethod
+    def getSignatureText(signature):
+        return f"""{signature.get("name", "")}: {signature.get("description", "")}"""
+
+    @staticmethod
+    def isEnabled():
+        # routing adds no network request before completions, as it works only with local embedding models
+        return config.toolRouting and ToolRouter.available and not config.isTermux and not config.embeddingModel == "text-embedding-ada-002"
+
+    @staticmethod
+    def normalise(vector):
+        vector = numpy.asarray(vector, dtype=numpy.float32)
+        norm = numpy.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def getEmbeddings(signatures):
+        keys = [(config.embeddingModel, ToolRouter.getSignatureText(i)) for i in signatures]
+        with ToolRouter.lock:
+            # signatures are embedded once only
+            newKeys = list(dict.fromkeys(key for key in keys if not key in ToolRouter.embeddings))
+            if newKeys:
+                for key, embedding in zip(newKeys, EmbeddingService.embed([text for _, text in newKeys])):
+                    ToolRouter.embeddings[key] = ToolRouter.normalise(embedding)
+            return [ToolRouter.embeddings[key] for key in keys]
+
+    @staticmethod
+    def selectSignatures(signatures, query, requiredFunctions=()):
+        # return function signatures relevant to the query, in their original order
+        topK = config.toolRoutingTopK
+        if not ToolRouter.isEnabled() or not query or len(signatures) <= topK:
+            return signatures
+        required = set(config.toolRoutingCoreFunctions)
+        required.update(i for i in requiredFunctions if i)
+        try:
+            signatureEmbeddings = ToolRouter.getEmbeddings(signatures)
+            queryEmbedding = ToolRouter.normalise(EmbeddingService.embed([query])[0])
+        except:
+            ToolRouter.available = False
+            if config.developer:
+                print("Embeddings are not available for selecting relevant functions!")
+            return signatures
+        scores = numpy.stack(signatureEmbeddings) @ queryEmbedding
+        optional = [index for index, signature in enumerate(signatures) if not signature.get("name") in required]
+        selected = set(sorted(optional, key=lambda index: scores[index], reverse=True)[:topK])
+        return [signature for index, signature in enumerate(signatures) if index in selected or signature.get("name") in required]
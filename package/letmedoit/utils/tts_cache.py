@@ -0,0 +1,92 @@
+from letmedoit import config
+from letmedoit.utils.shared_utils import SharedUtil
+import os, json, hashlib, shutil, threading
+
+
+class TTSCache:
+
+    # synthesized speech, stored outside the temp folder that is cleared on exit
+    folder = ""
+    # audio files queued or being played, which are not evicted; values are numbers of uses
+    pinned = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def getFolder():
+        if not TTSCache.folder:
+            storageDir = SharedUtil.getStorageDir()
+            folder = os.path.join(storageDir if storageDir else config.letMeDoItAIFolder, "cache", "tts")
+            os.makedirs(folder, exist_ok=True)
+            TTSCache.folder = folder
+        return TTSCache.folder
+
+    @staticmethod
+    def isEnabled():
+        return config.ttsCacheMaxSize > 0
+
+    @staticmethod
+    def getKey(engine, language, voice, speed, content):
+        return hashlib.sha256(json.dumps([engine, language, voice, speed, content]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def pin(audioFile):
+        TTSCache.pinned[audioFile] = TTSCache.pinned.get(audioFile, 0) + 1
+
+    @staticmethod
+    def release(audioFile):
+        # call once an audio file returned by getAudioFile or store is played or discarded
+        with TTSCache.lock:
+            count = TTSCache.pinned.get(audioFile, 0) - 1
+            if count > 0:
+                TTSCache.pinned[audioFile] = count
+            else:
+                TTSCache.pinned.pop(audioFile, None)
+
+    @staticmethod
+    def getAudioFile(key):
+        audioFile = os.path.join(TTSCache.getFolder(), f"{key}.mp3")
+        with TTSCache.lock:
+            if os.path.isfile(audioFile):
+                try:
+                    # modification time records the last use for eviction
+                    os.utime(audioFile)
+                except:
+                    pass
+                TTSCache.pin(audioFile)
+                return audioFile
+        return ""
+
+    @staticmethod
+    def store(key, audioFile):
+        cachedFile = os.path.join(TTSCache.getFolder(), f"{key}.mp3")
+        with TTSCache.lock:
+            shutil.move(audioFile, cachedFile)
+            TTSCache.pin(cachedFile)
+            TTSCache.evict()
+        return cachedFile
+
+    @staticmethod
+    def evict():
+        # remove the least recently used audio files when the cache exceeds config.ttsCacheMaxSize (in MB)
+        # files waiting to be played or being played are kept
+        maxSize = config.ttsCacheMaxSize * 1024 * 1024
+        files = []
+        totalSize = 0
+        with os.scandir(TTSCache.getFolder()) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".mp3"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    totalSize += stat.st_size
+        if totalSize <= maxSize:
+            return None
+        for _, size, path in sorted(files):
+            if path in TTSCache.pinned:
+                continue
+            try:
+                os.remove(path)
+                totalSize -= size
+            except:
+                pass
+            if totalSize <= maxSize:
+                break
@@ -1,7 +1,8 @@
 from letmedoit import config
-import os, traceback, subprocess, re
+import os, traceback, subprocess, re, threading, queue, uuid
 from gtts import gTTS
 from letmedoit.utils.vlc_utils import VlcUtil
+from letmedoit.utils.tts_cache import TTSCache
 try:
     from google.cloud import texttospeech
 except:
@@ -15,65 +16,133 @@ except:
 
 class TTSUtil:
 
+    # background speech pipeline shared by streamed responses
+    pipeline = None
+
     @staticmethod
     def play(content, language=""):
         if config.tts:
             try:
-                credentials_GoogleCloudTextToSpeech = os.path.join(config.letMeDoItAIFolder, "credentials_GoogleCloudTextToSpeech.json")
-                # official google-cloud-texttospeech
-                if os.path.isfile(credentials_GoogleCloudTextToSpeech):
-                    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_GoogleCloudTextToSpeech
-                    audioFile = os.path.join(config.letMeDoItAIFolder, "temp", "gctts.mp3")
-                    if not language:
-                        language = config.gcttsLang
-                    elif language == "yue":
-                        language = "yue-HK"
-                    elif "-" in language:
-                        language, accent = language.split("-", 1)
-                        language = f"{language}-{accent.upper()}"
-                    TTSUtil.saveCloudTTSAudio(content, language, filename=audioFile)
-                    TTSUtil.playAudioFile(audioFile)
-                elif config.ttsCommand:
-                    # remove '"' from the content
-                    content = re.sub('"', "", content)
-
-                    # Windows users
-                    # https://stackoverflow.com/questions/1040655/ms-speech-from-command-lines
-                    # https://www.powerofpowershell.com/post/powershell-can-speak-too#:~:text=The%20Add%2DType%20cmdlet%20is,want%20to%20convert%20into%20speech.
-                    windows = (config.ttsCommand.lower() == "windows")
-                    if windows:
-                        content = re.sub("'", "", content)
-                    if language and language in config.ttsLanguagesCommandMap and config.ttsLanguagesCommandMap[language]:
-                        voice = config.ttsLanguagesCommandMap[language]
-                        if windows:
-                            command = f'''PowerShell -Command "Add-Type –AssemblyName System.Speech; $ttsEngine = New-Object System.Speech.Synthesis.SpeechSynthesizer; $ttsEngine.SelectVoice('{voice} Desktop'); $ttsEngine.Speak('{content}');"'''
-                        else:
-                            ttsCommand = re.sub("^(.*?) [^ ]+?$", r"\1", config.ttsCommand.strip()) + " " + voice
-                            command = f'''{ttsCommand} "{content}"{config.ttsCommandSuffix}'''
-                    else:
-                        if windows:
-                            command = f'''PowerShell -Command "Add-Type –AssemblyName System.Speech; (New-Object System.Speech.Synthesis.SpeechSynthesizer).Speak('{content}');"'''
-                        else:
-                            command = f'''{config.ttsCommand} "{content}"{config.ttsCommandSuffix}'''
-                    subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
-                else:
-                    # use gTTS as default as config.ttsCommand is empty by default
-                    if not language:
-                        language = config.gttsLang
-                    elif language == "yue":
-                        language = "zh"
-                    elif "-" in language:
-                        language = re.sub("^(.*?)\-.*?$", r"\1", language)
-                    audioFile = os.path.join(config.letMeDoItAIFolder, "temp", "gtts.mp3")
-                    tts = gTTS(content, lang=language, tld=config.gttsTld) if config.gttsTld else gTTS(content, lang=language)
-                    tts.save(audioFile)
-                    TTSUtil.playAudioFile(audioFile)
+                speech = TTSUtil.synthesize(content, language)
+                try:
+                    TTSUtil.playSpeech(speech)
+                finally:
+                    TTSUtil.releaseSpeech(speech)
             except:
                 if config.developer:
                     print(traceback.format_exc())
                 else:
                     pass
 
+    @staticmethod
+    def playInBackground(content, language=""):
+        # text output does not wait for speech
+        if config.tts:
+            if TTSUtil.pipeline is None:
+                TTSUtil.pipeline = TTSPipeline()
+            TTSUtil.pipeline.say(content, language)
+
+    @staticmethod
+    def stopBackgroundPlay():
+        if TTSUtil.pipeline is not None:
+            TTSUtil.pipeline.stop()
+
+    @staticmethod
+    def getTemporaryAudioFile():
+        folder = os.path.join(config.letMeDoItAIFolder, "temp")
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"tts_{uuid.uuid4().hex}.mp3")
+
+    # return a tuple of ("audio", audio file path) or ("command", tts command)
+    @staticmethod
+    def synthesize(content, language="", audioFile=""):
+        credentials_GoogleCloudTextToSpeech = os.path.join(config.letMeDoItAIFolder, "credentials_GoogleCloudTextToSpeech.json")
+        # official google-cloud-texttospeech
+        if os.path.isfile(credentials_GoogleCloudTextToSpeech):
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_GoogleCloudTextToSpeech
+            if not audioFile:
+                audioFile = os.path.join(config.letMeDoItAIFolder, "temp", "gctts.mp3")
+            if not language:
+                language = config.gcttsLang
+            elif language == "yue":
+                language = "yue-HK"
+            elif "-" in language:
+                language, accent = language.split("-", 1)
+                language = f"{language}-{accent.upper()}"
+            return TTSUtil.synthesizeAudio(("gctts", language, "", config.gcttsSpeed, content), lambda: TTSUtil.saveCloudTTSAudio(content, language, filename=audioFile), audioFile)
+        elif config.ttsCommand:
+            # remove '"' from the content
+            content = re.sub('"', "", content)
+
+            # Windows users
+            # https://stackoverflow.com/questions/1040655/ms-speech-from-command-lines
+            # https://www.powerofpowershell.com/post/powershell-can-speak-too#:~:text=The%20Add%2DType%20cmdlet%20is,want%20to%20convert%20into%20speech.
+            windows = (config.ttsCommand.lower() == "windows")
+            if windows:
+                content = re.sub("'", "", content)
+            if language and language in config.ttsLanguagesCommandMap and config.ttsLanguagesCommandMap[language]:
+                voice = config.ttsLanguagesCommandMap[language]
+                if windows:
+                    command = f'''PowerShell -Command "Add-Type –AssemblyName System.Speech; $ttsEngine = New-Object System.Speech.Synthesis.SpeechSynthesizer; $ttsEngine.SelectVoice('{voice} Desktop'); $ttsEngine.Speak('{content}');"'''
+                else:
+                    ttsCommand = re.sub("^(.*?) [^ ]+?$", r"\1", config.ttsCommand.strip()) + " " + voice
+                    command = f'''{ttsCommand} "{content}"{config.ttsCommandSuffix}'''
+            else:
+                if windows:
+                    command = f'''PowerShell -Command "Add-Type –AssemblyName System.Speech; (New-Object System.Speech.Synthesis.SpeechSynthesizer).Speak('{content}');"'''
+                else:
+                    command = f'''{config.ttsCommand} "{content}"{config.ttsCommandSuffix}'''
+            # tts command synthesizes and plays speech at the same time
+            return ("command", command)
+        else:
+            # use gTTS as default as config.ttsCommand is empty by default
+            if not language:
+                language = config.gttsLang
+            elif language == "yue":
+                language = "zh"
+            elif "-" in language:
+                language = re.sub("^(.*?)\-.*?$", r"\1", language)
+            if not audioFile:
+                audioFile = os.path.join(config.letMeDoItAIFolder, "temp", "gtts.mp3")
+            def saveGttsAudio():
+                tts = gTTS(content, lang=language, tld=config.gttsTld) if config.gttsTld else gTTS(content, lang=language)
+                tts.save(audioFile)
+            return TTSUtil.synthesizeAudio(("gtts", language, config.gttsTld, "", content), saveGttsAudio, audioFile)
+
+    @staticmethod
+    def synthesizeAudio(cacheKey, saveAudio, audioFile):
+        # repeated speech is played from cache without a network round trip
+        if TTSCache.isEnabled():
+            key = TTSCache.getKey(*cacheKey)
+            cachedFile = TTSCache.getAudioFile(key)
+            if cachedFile:
+                return ("audio", cachedFile)
+            saveAudio()
+            try:
+                return ("audio", TTSCache.store(key, audioFile))
+            except:
+                if config.developer:
+                    print(traceback.format_exc())
+        else:
+            saveAudio()
+        return ("audio", audioFile)
+
+    @staticmethod
+    def releaseSpeech(speech):
+        # cached audio files can be evicted once they are played
+        kind, value = speech
+        if kind == "audio":
+            TTSCache.release(value)
+
+    @staticmethod
+    def playSpeech(speech):
+        kind, value = speech
+        if kind == "command":
+            subprocess.Popen(value, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+        else:
+            TTSUtil.playAudioFile(value)
+
     @staticmethod
     def playAudioFile(audioFile):
         try:
@@ -153,3 +222,57 @@ class TTSUtil:
             # Write the response to the output file.
             out.write(response.audio_content)
             #print('Audio content written to file "{0}"'.format(outputFile))
+
+
+class TTSPipeline:
+
+    # Speech of streamed responses is prepared and played by two background workers:
+    # the synthesizer prepares audio of the next chunk while the player plays the current one.
+
+    def __init__(self):
+        # speech queued before the latest stop() is discarded
+        self.generation = 0
+        self.textQueue = queue.Queue()
+        # the synthesizer works no further than one chunk ahead of the player
+        self.audioQueue = queue.Queue(maxsize=1)
+        threading.Thread(target=self.runSynthesizer, daemon=True).start()
+        threading.Thread(target=self.runPlayer, daemon=True).start()
+
+    def say(self, content, language=""):
+        self.textQueue.put((self.generation, content, language))
+
+    def stop(self):
+        self.generation += 1
+
+    def runSynthesizer(self):
+        while True:
+            generation, content, language = self.textQueue.get()
+            if not generation == self.generation:
+                continue
+            audioFile = TTSUtil.getTemporaryAudioFile()
+            try:
+                speech = TTSUtil.synthesize(content, language, audioFile=audioFile)
+            except:
+                if config.developer:
+                    print(traceback.format_exc())
+                continue
+            self.audioQueue.put((generation, speech, audioFile))
+
+    def runPlayer(self):
+        while True:
+            generation, speech, audioFile = self.audioQueue.get()
+            kind, value = speech
+            try:
+                if generation == self.generation:
+                    TTSUtil.playSpeech(speech)
+            except:
+                if config.developer:
+                    print(traceback.format_exc())
+            finally:
+                TTSUtil.releaseSpeech(speech)
+                # cached audio is kept for later use
+                if kind == "audio" and value == audioFile and os.path.isfile(value):
+                    try:
+                        os.remove(value)
+                    except:
+                        pass
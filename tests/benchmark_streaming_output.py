@@ -0,0 +1,41 @@
+from letmedoit import config
+from letmedoit.utils.streaming_word_wrapper import StreamingWordWrapper
+import sys, threading, time
+from types import SimpleNamespace
+
+
+# compare the number of terminal writes made when 1,000 tokens are streamed, with and without a frame rate limit
+
+class CountingStdout:
+
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, content):
+        self.writes += 1
+        return len(content)
+
+    def flush(self):
+        pass
+
+def getCompletion(tokens=1000, delay=0.001):
+    words = ("Lorem", " ipsum", " dolor", " sit", " amet", ",", " consectetur", " adipiscing", " elit", ".", "\n", " 中文", "回答")
+    for i in range(tokens):
+        time.sleep(delay)
+        yield SimpleNamespace(text=words[i % len(words)])
+
+def benchmark(frameRate, tokens=1000):
+    config.streamingFrameRate = frameRate
+    config.ttsOutput = False
+    stdout, sys.stdout = sys.stdout, CountingStdout()
+    try:
+        start = time.perf_counter()
+        StreamingWordWrapper().streamOutputs(threading.Event(), getCompletion(tokens))
+        elapsed = time.perf_counter() - start
+        writes = sys.stdout.writes
+    finally:
+        sys.stdout = stdout
+    print(f"frame rate {frameRate if frameRate else 'unlimited'}: {writes} writes per {tokens} tokens in {elapsed:.2f}s")
+
+for frameRate in (0, 60, 30):
+    benchmark(frameRate)
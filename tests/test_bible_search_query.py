@@ -0,0 +1,44 @@
+from letmedoit.plugins.bibleTools.utils.BibleDatabase import BibleDatabase
+import sqlite3
+
+
+# LIKE and REGEXP searches are narrowed with a full-text index, with column names qualified or not
+
+def getConnection():
+    connection = sqlite3.connect(":memory:")
+    connection.create_function("REGEXP", 2, lambda pattern, text: __import__("re").search(pattern, text) is not None)
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE Verses (Book INT, Chapter INT, Verse INT, Scripture TEXT)")
+    cursor.executemany("INSERT INTO Verses VALUES (?, ?, ?, ?)", [(43, 3, 16, "For God so loved the world"), (62, 4, 8, "God is love"), (1, 1, 1, "In the beginning")])
+    cursor.execute("ATTACH DATABASE ':memory:' AS fts")
+    cursor.execute("CREATE VIRTUAL TABLE fts.VerseIndex USING fts5(Scripture, content='', tokenize='trigram')")
+    cursor.execute("INSERT INTO VerseIndex(rowid, Scripture) SELECT rowid, Scripture FROM Verses")
+    return connection
+
+def getResults(query):
+    connection = getConnection()
+    attachIndex = BibleDatabase.attachIndex
+    BibleDatabase.attachIndex = staticmethod(lambda bible, connection: True)
+    try:
+        searchQuery = BibleDatabase.getSearchQuery("NET", connection, query)
+    finally:
+        BibleDatabase.attachIndex = attachIndex
+    assert "fts.VerseIndex" in searchQuery, searchQuery
+    return connection.cursor().execute(searchQuery).fetchall()
+
+def test_unqualified_query():
+    assert [i[0] for i in getResults("SELECT * FROM Verses WHERE Scripture LIKE '%love%'")] == [43, 62]
+
+def test_aliased_query():
+    query = "SELECT v.Book FROM Verses v WHERE v.Scripture LIKE '%love%' AND v.Scripture REGEXP 'world'"
+    assert getResults(query) == [(43,)]
+
+def test_qualified_query():
+    assert getResults("SELECT Book FROM Verses WHERE Verses.Scripture REGEXP '\\bbeginning\\b'") == [(1,)]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+    print("All tests passed!")
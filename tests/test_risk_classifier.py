@@ -0,0 +1,36 @@
+from letmedoit.utils.risk_classifier import RiskClassifier
+
+
+# numpy functions that read, write or map files, or load shared libraries, are not graded as low risk
+
+def test_numpy_file_io():
+    for code in (
+        "import numpy as np\nnp.savetxt('/etc/passwd', np.zeros(3))",
+        "import numpy\nnumpy.save('data.npy', numpy.zeros(3))",
+        "from numpy import savez\nsavez('data.npz', a=[1, 2])",
+        "import numpy as np\narr = np.zeros(3)\narr.tofile('data.bin')",
+        "import numpy\nm = numpy.memmap('data.bin', dtype='uint8', mode='w+', shape=(3,))",
+        "import numpy\nprint(numpy.fromfile('/dev/sda', dtype='uint8', count=512))",
+    ):
+        assert RiskClassifier.classify(code) == "medium", code
+
+def test_numpy_ctypeslib():
+    for code in (
+        "import numpy as np\nnp.ctypeslib.load_library('libc', '/lib')",
+        "from numpy import ctypeslib\nctypeslib.load_library('libc', '/lib')",
+    ):
+        assert RiskClassifier.classify(code) == "high", code
+
+def test_numpy_calculation_is_not_trusted():
+    # numpy is not a safe module, so that calculations are assessed by llm
+    assert RiskClassifier.classify("import numpy as np\nprint(np.mean([1, 2, 3]))") is None
+
+def test_safe_code():
+    assert RiskClassifier.classify("import math\nprint(math.sqrt(16))") == "low"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+    print("All tests passed!")